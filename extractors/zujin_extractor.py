@@ -14,12 +14,81 @@
 
 import os
 import re
+from functools import lru_cache
 from typing import Dict, List
 from docx import Document
 from dataclasses import dataclass, field
 
 from .table_utils import extract_property_rights_generic
 
+# 建成年代：按优先级排列（先命中的写法优先，而不是全文中最靠前的位置），模块加载时编译一次
+_BUILD_YEAR_PATTERNS = tuple(re.compile(p) for p in (
+    r'建成于(\d{4})年',
+    r'约(\d{4})年建成',
+    r'建成年代[：:]\s*(\d{4})',
+    r'(\d{4})年建成',
+    r'建成于上世纪(\d{2})年代',
+))
+# 价值时点：按优先级排列，分组为 年/月/日
+_VALUE_DATE_PATTERNS = tuple(re.compile(p) for p in (
+    r'价值时点[：:]\s*(\d{4})[年\.](\d{1,2})[月\.](\d{1,2})',
+    r'价值时点(\d{4})\.(\d{1,2})\.(\d{1,2})',
+    r'价值时点为(\d{4})年(\d{1,2})月(\d{1,2})日',
+))
+# 楼层修正：全文找“×xx%＝”
+_FLOOR_FACTOR_RE = re.compile(r'×\s*(\d+)%\s*[＝=]')
+# 估价目的（“本次估价目的是…”也会被这一条命中）
+_PURPOSE_RE = re.compile(r'估价目的[：:是为]*(.{5,80}?)(?:。|$)')
+
+# 去掉半角/全角空格（cells 由 c.text.strip() 生成，恒为 str）
+_STRIP_SPACES = str.maketrans('', '', ' \u3000')
+
+# 数值清洗：去掉数字和小数点以外的字符
+_NUMERIC_CLEANUP = re.compile(r'[^\d.]')
+
+# 修正计算表：行标签关键字 -> Case 字段
+_ROW_MAPPING = {
+    '交易价格': 'rental_price',
+    '交易情况修正': 'transaction_correction',
+    '市场状况': 'market_correction',
+    '区位状况': 'location_correction',
+    '实物状况': 'physical_correction',
+    '权益状况': 'rights_correction',
+    '调整后单价': 'adjusted_price',
+}
+
+# 因素表（描述/等级/指数）中可比实例A/B/C所在列
+_CASE_COLS = (3, 4, 5)
+
+# 区域/街道：按优先级排列（区 > 县 > 市，街道 > 镇 > 乡），模块加载时编译一次
+_DISTRICT_PATTERNS = tuple(re.compile(p) for p in (
+    r'([\u4e00-\u9fa5]{2,4}区)',
+    r'([\u4e00-\u9fa5]{2,4}县)',
+    r'([\u4e00-\u9fa5]{2,4}市)',
+))
+_STREET_PATTERNS = tuple(re.compile(p) for p in (
+    r'([\u4e00-\u9fa5]{2,6}街道)',
+    r'([\u4e00-\u9fa5]{2,4}镇)',
+    r'([\u4e00-\u9fa5]{2,4}乡)',
+))
+
+# 需要在全文上匹配的正则（每项按优先级排列）：extract() 时统一跑一遍并缓存结果
+_ALL_PATTERNS = (
+    ((_FLOOR_FACTOR_RE,), 'floor'),
+    (_BUILD_YEAR_PATTERNS, 'build'),
+    (_VALUE_DATE_PATTERNS, 'vdate'),
+    ((_PURPOSE_RE,), 'purpose'),
+)
+
+
+def _first_match(patterns, text: str):
+    """按优先级依次匹配，返回第一个命中的 Match（都未命中返回 None）"""
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            return match
+    return None
+
 
 @dataclass
 class Position:
@@ -182,10 +251,24 @@ class ZujinExtractor:
     RIGHTS_FACTORS = ['规划条件', '土地使用期限', '土地剩余使用年限', '担保物权设立', '租赁占用状况', '拖欠税费状况',
                       '登记状况', '他项权利', '限制权利', '其他因素']
 
+    # 因素名称 -> 类型 反查表（一次哈希代替三次列表成员判断）
+    _FACTOR_NAME_TO_TYPE = ({n: 'location' for n in LOCATION_FACTORS}
+                            | {n: 'physical' for n in PHYSICAL_FACTORS}
+                            | {n: 'rights' for n in RIGHTS_FACTORS})
+    # 名称未命中时按当前大类兜底
+    _CAT_TO_TYPE = {
+        '区位状况': 'location',
+        '实物状况': 'physical',
+        '实物因素': 'physical',
+        '权益状况': 'rights',
+        '权益因素': 'rights',
+    }
+
     def __init__(self, auto_detect: bool = True):
         self.doc = None
         self.tables = []
         self.full_text = ""
+        self._full_text_matches = {}
         self.auto_detect = auto_detect
 
     def extract(self, doc_path: str) -> ZujinExtractionResult:
@@ -193,6 +276,7 @@ class ZujinExtractor:
         self.doc = Document(doc_path)
         self.tables = self.doc.tables
         self.full_text = "\n".join([p.text for p in self.doc.paragraphs])
+        self._full_text_matches = {name: _first_match(pats, self.full_text) for pats, name in _ALL_PATTERNS}
 
         result = ZujinExtractionResult(source_file=os.path.basename(doc_path), type='zujin')
 
@@ -756,7 +840,7 @@ class ZujinExtractor:
         """提取因素描述表（表5）——按固定6列读取"""
         table = self.tables[self.TABLE_FACTOR_DESC]
 
-        COL_CATEGORY, COL_FACTOR, COL_SUBJECT, COL_A, COL_B, COL_C = 0, 1, 2, 3, 4, 5
+        COL_CATEGORY, COL_FACTOR, COL_SUBJECT = 0, 1, 2
 
         category_alias = {
             '区位状况': '区位状况',
@@ -766,14 +850,13 @@ class ZujinExtractor:
             '权益因素': '权益状况',
         }
 
-        current_category = ''
-        for row_idx, row in enumerate(table.rows[1:], 1):
-            cells = [c.text.strip().replace('\n', ' ') for c in row.cells]
-            if len(cells) < 6:
-                continue
+        subject_buckets = self._factor_buckets(result.subject)
+        case_buckets = [self._factor_buckets(case) for case in result.cases]
 
-            raw_category = (cells[COL_CATEGORY] or '').replace(' ', '').replace('　', '')
-            factor_name = (cells[COL_FACTOR] or '').replace(' ', '').replace('　', '')
+        current_category = ''
+        for row_idx, cells in self._factor_table_rows(table):
+            raw_category = cells[COL_CATEGORY].translate(_STRIP_SPACES)
+            factor_name = cells[COL_FACTOR].translate(_STRIP_SPACES)
 
             if raw_category in ('交易情况', '交易日期') or factor_name in ('交易情况', '交易日期'):
                 continue
@@ -793,26 +876,23 @@ class ZujinExtractor:
             # 估价对象
             subject_val = cells[COL_SUBJECT]
             if subject_val:
-                subject_dict = getattr(result.subject, f'{factor_type}_factors')
-                f = subject_dict.get(factor_key) or Factor(name=factor_key)
+                subject_dict = subject_buckets[factor_type]
+                f = self._get_or_create_factor(subject_dict, factor_key)
                 f.description = subject_val
                 f.desc_pos = Position(self.TABLE_FACTOR_DESC, row_idx, COL_SUBJECT)
-                subject_dict[factor_key] = f
 
                 # ✅ 关键修复：传 subject_val（不是 factor_type）
                 self._sync_subject_fields_from_factor(result.subject, factor_key, subject_val)
 
             # 可比实例A/B/C
-            for i, case in enumerate(result.cases):
-                col = [COL_A, COL_B, COL_C][i]
+            for case, col, buckets in zip(result.cases, _CASE_COLS, case_buckets):
                 value = cells[col]
                 if value == '':
                     continue
-                factor_dict = getattr(case, f'{factor_type}_factors')
-                f = factor_dict.get(factor_key) or Factor(name=factor_key)
+                factor_dict = buckets[factor_type]
+                f = self._get_or_create_factor(factor_dict, factor_key)
                 f.description = value
                 f.desc_pos = Position(self.TABLE_FACTOR_DESC, row_idx, col)
-                factor_dict[factor_key] = f
 
                 # ✅ 关键修复：传 value（不是 factor_type）
                 self._sync_case_fields_from_factor(case, factor_key, value)
@@ -820,7 +900,7 @@ class ZujinExtractor:
     def _extract_factor_levels(self, result: ZujinExtractionResult):
         """提取因素等级表（表6）——按固定6列读取"""
         table = self.tables[self.TABLE_FACTOR_LEVEL]
-        COL_CATEGORY, COL_FACTOR, COL_SUBJECT, COL_A, COL_B, COL_C = 0, 1, 2, 3, 4, 5
+        COL_CATEGORY, COL_FACTOR, COL_SUBJECT = 0, 1, 2
 
         category_alias = {
             '区位状况': '区位状况',
@@ -830,14 +910,13 @@ class ZujinExtractor:
             '权益因素': '权益状况',
         }
 
-        current_category = ''
-        for row_idx, row in enumerate(table.rows[1:], 1):
-            cells = [c.text.strip().replace('\n', ' ') for c in row.cells]
-            if len(cells) < 6:
-                continue
+        subject_buckets = self._factor_buckets(result.subject)
+        case_buckets = [self._factor_buckets(case) for case in result.cases]
 
-            raw_category = (cells[COL_CATEGORY] or '').replace(' ', '').replace('　', '')
-            factor_name = (cells[COL_FACTOR] or '').replace(' ', '').replace('　', '')
+        current_category = ''
+        for row_idx, cells in self._factor_table_rows(table):
+            raw_category = cells[COL_CATEGORY].translate(_STRIP_SPACES)
+            factor_name = cells[COL_FACTOR].translate(_STRIP_SPACES)
 
             if raw_category in ('交易情况', '交易日期') or factor_name in ('交易情况', '交易日期'):
                 continue
@@ -857,28 +936,25 @@ class ZujinExtractor:
             # 估价对象
             subject_val = cells[COL_SUBJECT]
             if subject_val:
-                subject_dict = getattr(result.subject, f'{factor_type}_factors')
-                f = subject_dict.get(factor_key) or Factor(name=factor_key)
+                subject_dict = subject_buckets[factor_type]
+                f = self._get_or_create_factor(subject_dict, factor_key)
                 f.level = subject_val
                 f.level_pos = Position(self.TABLE_FACTOR_LEVEL, row_idx, COL_SUBJECT)
-                subject_dict[factor_key] = f
 
             # 可比实例
-            for i, case in enumerate(result.cases):
-                col = [COL_A, COL_B, COL_C][i]
+            for col, buckets in zip(_CASE_COLS, case_buckets):
                 value = cells[col]
                 if value == '':
                     continue
-                factor_dict = getattr(case, f'{factor_type}_factors')
-                f = factor_dict.get(factor_key) or Factor(name=factor_key)
+                factor_dict = buckets[factor_type]
+                f = self._get_or_create_factor(factor_dict, factor_key)
                 f.level = value
                 f.level_pos = Position(self.TABLE_FACTOR_LEVEL, row_idx, col)
-                factor_dict[factor_key] = f
 
     def _extract_factor_indices(self, result: ZujinExtractionResult):
         """提取因素指数表（表7）——按固定6列读取"""
         table = self.tables[self.TABLE_FACTOR_INDEX]
-        COL_CATEGORY, COL_FACTOR, COL_SUBJECT, COL_A, COL_B, COL_C = 0, 1, 2, 3, 4, 5
+        COL_CATEGORY, COL_FACTOR, COL_SUBJECT = 0, 1, 2
 
         category_alias = {
             '区位状况': '区位状况',
@@ -894,14 +970,13 @@ class ZujinExtractor:
             except Exception:
                 return 100
 
-        current_category = ''
-        for row_idx, row in enumerate(table.rows[1:], 1):
-            cells = [c.text.strip().replace('\n', ' ') for c in row.cells]
-            if len(cells) < 6:
-                continue
+        subject_buckets = self._factor_buckets(result.subject)
+        case_buckets = [self._factor_buckets(case) for case in result.cases]
 
-            raw_category = (cells[COL_CATEGORY] or '').replace(' ', '').replace('　', '')
-            factor_name = (cells[COL_FACTOR] or '').replace(' ', '').replace('　', '')
+        current_category = ''
+        for row_idx, cells in self._factor_table_rows(table):
+            raw_category = cells[COL_CATEGORY].translate(_STRIP_SPACES)
+            factor_name = cells[COL_FACTOR].translate(_STRIP_SPACES)
 
             if raw_category in ('交易情况', '交易日期') or factor_name in ('交易情况', '交易日期'):
                 continue
@@ -921,78 +996,105 @@ class ZujinExtractor:
             # 估价对象
             subject_val = cells[COL_SUBJECT]
             if subject_val:
-                subject_dict = getattr(result.subject, f'{factor_type}_factors')
-                f = subject_dict.get(factor_key) or Factor(name=factor_key)
+                subject_dict = subject_buckets[factor_type]
+                f = self._get_or_create_factor(subject_dict, factor_key)
                 f.index = to_int(subject_val)
                 f.index_pos = Position(self.TABLE_FACTOR_INDEX, row_idx, COL_SUBJECT)
-                subject_dict[factor_key] = f
 
             # 可比实例
-            for i, case in enumerate(result.cases):
-                col = [COL_A, COL_B, COL_C][i]
+            for col, buckets in zip(_CASE_COLS, case_buckets):
                 value = cells[col]
                 if value == '':
                     continue
-                factor_dict = getattr(case, f'{factor_type}_factors')
-                f = factor_dict.get(factor_key) or Factor(name=factor_key)
+                factor_dict = buckets[factor_type]
+                f = self._get_or_create_factor(factor_dict, factor_key)
                 f.index = to_int(value)
                 f.index_pos = Position(self.TABLE_FACTOR_INDEX, row_idx, col)
-                factor_dict[factor_key] = f
 
     def _extract_corrections(self, result: ZujinExtractionResult):
         """提取修正系数"""
         table = self.tables[self.TABLE_CORRECTION]
         COL_A = 1
 
-        ROW_MAPPING = {
-            '交易价格': 'rental_price',
-            '交易情况修正': 'transaction_correction',
-            '市场状况': 'market_correction',
-            '区位状况': 'location_correction',
-            '实物状况': 'physical_correction',
-            '权益状况': 'rights_correction',
-            '调整后单价': 'adjusted_price',
-        }
-
         for row_idx, row in enumerate(table.rows):
             cells = [c.text.strip() for c in row.cells]
             if len(cells) < 2:
                 continue
 
             label = cells[0].replace(' ', '').replace('\u3000', '')
-            field_name = None
-            for key, field in ROW_MAPPING.items():
-                if key in label:
-                    field_name = field
-                    break
+            # 多数报告行标签与关键字完全一致，先走哈希，未命中再做子串匹配
+            field_name = _ROW_MAPPING.get(label)
+            if field_name is None:
+                for key, field in _ROW_MAPPING.items():
+                    if key in label:
+                        field_name = field
+                        break
             if not field_name:
                 continue
 
             for i, case in enumerate(result.cases):
                 col = COL_A + i
-                if col < len(cells):
-                    try:
-                        value = float(re.sub(r"[^\d.]", "", cells[col]))
-                        loc_val = LocatedValue(
-                            value=value,
-                            position=Position(self.TABLE_CORRECTION, row_idx, col),
-                            raw_text=cells[col]
-                        )
-                        setattr(case, field_name, loc_val)
-                    except:
-                        pass
+                if col >= len(cells):
+                    continue
+                cleaned = _NUMERIC_CLEANUP.sub('', cells[col])
+                if not cleaned or cleaned == '.':
+                    continue
+                try:
+                    value = float(cleaned)
+                except (ValueError, TypeError):
+                    continue
+                loc_val = LocatedValue(
+                    value=value,
+                    position=Position(self.TABLE_CORRECTION, row_idx, col),
+                    raw_text=cells[col]
+                )
+                setattr(case, field_name, loc_val)
 
     # ----------------- 规则/同步（保持你 shezhi 的写法） -----------------
 
-    def _get_factor_type(self, factor_name: str, current_category: str) -> str:
-        """获取因素类型"""
-        if factor_name in self.LOCATION_FACTORS or current_category == '区位状况':
-            return 'location'
-        elif factor_name in self.PHYSICAL_FACTORS or current_category in ('实物状况', '实物因素'):
-            return 'physical'
-        elif factor_name in self.RIGHTS_FACTORS or current_category in ('权益状况', '权益因素'):
-            return 'rights'
-        return ''
+    @staticmethod
+    def _factor_table_rows(table, width: int = 6):
+        """
+        读取因素表（跳过表头）的单元格文本，返回 [(row_idx, cells), ...]
+
+        列宽只在这里校验一次：不足 width 列的行直接丢弃并提示，
+        调用方的行循环里不再逐行判断长度。
+        """
+        rows = []
+        skipped = 0
+        for row_idx, row in enumerate(table.rows[1:], 1):
+            cells = [c.text.strip().replace('\n', ' ') for c in row.cells]
+            if len(cells) < width:
+                skipped += 1
+                continue
+            rows.append((row_idx, cells))
+        if skipped:
+            print(f"   ⚠️ 因素表有 {skipped} 行不足 {width} 列，已跳过")
+        return rows
+
+    @staticmethod
+    def _get_or_create_factor(factor_dict: Dict[str, Factor], factor_key: str) -> Factor:
+        """取出因素；首次出现时才创建（描述/等级/指数三张表共用同一个 Factor）"""
+        f = factor_dict.get(factor_key)
+        if f is None:
+            f = factor_dict[factor_key] = Factor(name=factor_key)
+        return f
+
+    @staticmethod
+    def _factor_buckets(obj) -> Dict[str, Dict[str, Factor]]:
+        """按因素类型取 subject/case 上的三个因素字典（行循环前一次性构建）"""
+        return {
+            'location': obj.location_factors,
+            'physical': obj.physical_factors,
+            'rights': obj.rights_factors,
+        }
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _get_factor_type(factor_name: str, current_category: str) -> str:
+        """获取因素类型（先按因素名称，未命中再按当前大类；纯函数，进程内缓存）"""
+        return (ZujinExtractor._FACTOR_NAME_TO_TYPE.get(factor_name)
+                or ZujinExtractor._CAT_TO_TYPE.get(current_category, ''))
 
     def _sync_subject_fields_from_factor(self, subject: Subject, factor_key: str, val: str):
         """把因素描述同步到 Subject 的新增字段（不改变输出结构）"""
@@ -1065,92 +1167,51 @@ class ZujinExtractor:
 
     def _extract_floor_factor(self, result: ZujinExtractionResult):
         """提取楼层修正系数（与 shezhi 同套路：从全文找“×xx%”）"""
-        match = re.search(r'×\s*(\d+)%\s*[＝=]', self.full_text)
+        match = self._full_text_matches.get('floor')
         if match:
             result.floor_factor = int(match.group(1)) / 100
 
     def _extract_extended_info(self, result: ZujinExtractionResult):
         """提取扩展信息（建成年代、价值时点、估价目的等）——按 shezhi 方式"""
         # 建成年代（租金报告不一定有，能提就提）
-        build_patterns = [
-            r'建成于(\d{4})年',
-            r'约(\d{4})年建成',
-            r'建成年代[：:]\s*(\d{4})',
-            r'(\d{4})年建成',
-            r'建成于上世纪(\d{2})年代',
-        ]
-        for pattern in build_patterns:
-            match = re.search(pattern, self.full_text)
-            if match:
-                year_str = match.group(1)
-                if len(year_str) == 2:
-                    result.subject.build_year = 1900 + int(year_str)
-                else:
-                    result.subject.build_year = int(year_str)
-                break
+        match = self._full_text_matches.get('build')
+        if match:
+            year_str = match.group(1)
+            if len(year_str) == 2:
+                result.subject.build_year = 1900 + int(year_str)
+            else:
+                result.subject.build_year = int(year_str)
 
         # 价值时点
-        value_date_patterns = [
-            r'价值时点[：:]\s*(\d{4})[年\.](\d{1,2})[月\.](\d{1,2})',
-            r'价值时点(\d{4})\.(\d{1,2})\.(\d{1,2})',
-            r'价值时点为(\d{4})年(\d{1,2})月(\d{1,2})日',
-        ]
-        for pattern in value_date_patterns:
-            match = re.search(pattern, self.full_text)
-            if match:
-                result.subject.value_date = f"{match.group(1)}-{match.group(2).zfill(2)}-{match.group(3).zfill(2)}"
-                break
+        match = self._full_text_matches.get('vdate')
+        if match:
+            year, month, day = match.groups()
+            result.subject.value_date = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
 
         # 估价目的
-        purpose_patterns = [
-            r'估价目的[：:是为]*(.{5,80}?)(?:。|$)',
-            r'本次估价目的是(.{5,80}?)(?:。|$)',
-        ]
-        for pattern in purpose_patterns:
-            match = re.search(pattern, self.full_text)
-            if match:
-                result.subject.appraisal_purpose = match.group(1).strip()
-                break
+        match = self._full_text_matches.get('purpose')
+        if match:
+            result.subject.appraisal_purpose = match.group(1).strip()
+
+    @staticmethod
+    def _search_first(patterns, text: str) -> str:
+        """按优先级依次匹配，返回第一个命中的分组（未命中返回空串）"""
+        match = _first_match(patterns, text)
+        return match.group(1) if match else ""
 
     def _parse_district(self, result: ZujinExtractionResult):
         """从地址解析区域信息（照搬 shezhi 逻辑）"""
-        address = result.subject.address.value or ""
-
-        district_patterns = [
-            r'([\u4e00-\u9fa5]{2,4}区)',
-            r'([\u4e00-\u9fa5]{2,4}县)',
-            r'([\u4e00-\u9fa5]{2,4}市)',
-        ]
-        for pattern in district_patterns:
-            match = re.search(pattern, address)
-            if match:
-                result.subject.district = match.group(1)
-                break
-
-        street_patterns = [
-            r'([\u4e00-\u9fa5]{2,6}街道)',
-            r'([\u4e00-\u9fa5]{2,4}镇)',
-            r'([\u4e00-\u9fa5]{2,4}乡)',
-        ]
-        for pattern in street_patterns:
-            match = re.search(pattern, address)
-            if match:
-                result.subject.street = match.group(1)
-                break
-
-        # 同样处理可比实例
-        for case in result.cases:
-            case_addr = case.address.value or ""
-            for pattern in district_patterns:
-                match = re.search(pattern, case_addr)
-                if match:
-                    case.district = match.group(1)
-                    break
-            for pattern in street_patterns:
-                match = re.search(pattern, case_addr)
-                if match:
-                    case.street = match.group(1)
-                    break
+        targets = [result.subject, *result.cases]
+        for target in targets:
+            address = target.address.value or ""
+            if not address:
+                continue
+            district = self._search_first(_DISTRICT_PATTERNS, address)
+            if district:
+                target.district = district
+            street = self._search_first(_STREET_PATTERNS, address)
+            if street:
+                target.street = street
 
 
 # ============================================================================
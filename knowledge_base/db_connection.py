@@ -5,9 +5,19 @@ PostgreSQL 和 Milvus 连接管理
 """
 
 import os
+import re
+import weakref
+import itertools
+import threading
 from typing import Optional
 from contextlib import contextmanager
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 
 # ============================================================================
 # PostgreSQL 配置
@@ -22,9 +32,25 @@ PG_CONFIG = {
 }
 
 
+_json_loader_registered = False
+
+
+def _register_json_loader():
+    """json/jsonb 列改用 orjson 解码（psycopg2 默认用标准库 json，逐行解码是查询热点）"""
+    global _json_loader_registered
+    if _json_loader_registered or not HAS_ORJSON:
+        return
+
+    import psycopg2.extras
+    psycopg2.extras.register_default_json(globally=True, loads=orjson.loads)
+    psycopg2.extras.register_default_jsonb(globally=True, loads=orjson.loads)
+    _json_loader_registered = True
+
+
 def get_pg_connection():
     """获取 PostgreSQL 连接"""
     import psycopg2
+    _register_json_loader()
     return psycopg2.connect(
         host=PG_CONFIG['host'],
         port=PG_CONFIG['port'],
@@ -34,11 +60,88 @@ def get_pg_connection():
     )
 
 
+# 服务端游标每次从服务器取回的行数
+PG_ITERSIZE = 1000
+
+# 连接池大小
+PG_POOL_MIN = int(os.getenv('PG_POOL_MIN', '1'))
+PG_POOL_MAX = int(os.getenv('PG_POOL_MAX', '16'))
+
+_pg_pool = None
+_pg_pool_lock = threading.Lock()
+
+
+def get_pg_pool():
+    """获取 PostgreSQL 连接池（首次使用时创建）"""
+    global _pg_pool
+    if _pg_pool is None:
+        with _pg_pool_lock:
+            if _pg_pool is None:
+                import psycopg2.pool
+                _register_json_loader()
+                _pg_pool = psycopg2.pool.ThreadedConnectionPool(
+                    PG_POOL_MIN,
+                    PG_POOL_MAX,
+                    host=PG_CONFIG['host'],
+                    port=PG_CONFIG['port'],
+                    user=PG_CONFIG['user'],
+                    password=PG_CONFIG['password'],
+                    database=PG_CONFIG['database'],
+                )
+    return _pg_pool
+
+
+def close_pg_pool():
+    """关闭连接池中的全部连接"""
+    global _pg_pool
+    with _pg_pool_lock:
+        if _pg_pool is not None:
+            _pg_pool.closeall()
+            _pg_pool = None
+
+
+def _acquire_pg_connection():
+    """从连接池取连接；池已满时临时新建一个连接，返回 (连接, 所属连接池或 None)"""
+    import psycopg2.pool
+    pool = get_pg_pool()
+    try:
+        return pool.getconn(), pool
+    except psycopg2.pool.PoolError:
+        return get_pg_connection(), None
+
+
+def _release_pg_connection(conn, pool):
+    """归还连接：先结束未提交的事务，已断开的连接直接丢弃"""
+    if pool is None:
+        conn.close()
+        return
+
+    broken = bool(conn.closed)
+    if not broken:
+        try:
+            conn.rollback()
+        except Exception:
+            broken = True
+    pool.putconn(conn, close=broken)
+
+
 @contextmanager
-def pg_cursor(commit=True):
-    """PostgreSQL 游标上下文管理器"""
-    conn = get_pg_connection()
-    cursor = conn.cursor()
+def pg_cursor(commit=True, name: Optional[str] = None):
+    """
+    PostgreSQL 游标上下文管理器
+
+    连接取自连接池，退出时归还（未提交的只读事务会先回滚）
+
+    Args:
+        commit: 退出时是否提交
+        name: 指定时创建服务端（命名）游标，迭代时按 PG_ITERSIZE 分批取回，不一次载入全部结果
+    """
+    conn, pool = _acquire_pg_connection()
+    if name:
+        cursor = conn.cursor(name=name)
+        cursor.itersize = PG_ITERSIZE
+    else:
+        cursor = conn.cursor()
     try:
         yield cursor
         if commit:
@@ -47,8 +150,70 @@ def pg_cursor(commit=True):
         conn.rollback()
         raise e
     finally:
-        cursor.close()
-        conn.close()
+        try:
+            cursor.close()
+        finally:
+            _release_pg_connection(conn, pool)
+
+
+# 连接 -> 已 PREPARE 的语句名；值为 None 表示该连接首次准备失败，之后不再使用预备语句
+_prepared_statements: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+# SQL 中的 %s 占位符和 %% 转义（%% 原样保留，由驱动还原为 %）
+_PLACEHOLDER_RE = re.compile(r'%%|%s')
+# SQLSTATE：预备语句不存在
+_UNDEFINED_PREPARED_STATEMENT = '26000'
+
+
+def _in_idle_transaction(conn) -> bool:
+    """连接当前是否没有进行中的事务"""
+    import psycopg2.extensions
+    return conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+def execute_prepared(cursor, name: str, sql: str, params: tuple = ()):
+    """
+    以服务端预备语句执行 sql（%s 占位符）
+
+    每个连接首次使用时把 PREPARE 和 EXECUTE 放在同一次请求里发送，不额外增加往返；
+    之后只发送 EXECUTE，省去服务端的解析和规划。服务端的预备语句丢失时（会话被重置、
+    经过连接池中间件等）清空该连接的记录并重新 PREPARE
+    """
+    conn = cursor.connection
+    prepared = _prepared_statements.setdefault(conn, set())
+    if prepared is None:
+        cursor.execute(sql, params)
+        return
+
+    placeholders = ', '.join(['%s'] * len(params))
+    execute_sql = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+    idle = _in_idle_transaction(conn)
+    if name in prepared:
+        try:
+            cursor.execute(execute_sql, params)
+            return
+        except Exception as e:
+            if getattr(e, 'pgcode', None) != _UNDEFINED_PREPARED_STATEMENT:
+                raise
+            # 服务端已没有该连接的预备语句，全部作废；事务里已有其他语句时无法重试
+            prepared.clear()
+            if not idle:
+                raise
+            conn.rollback()
+
+    numbers = itertools.count(1)
+    body = _PLACEHOLDER_RE.sub(lambda m: '%%' if m.group(0) == '%%' else f'${next(numbers)}', sql)
+    try:
+        cursor.execute(f"PREPARE {name} AS {body}; {execute_sql}", params)
+    except Exception:
+        # 失败时无法确定语句是否已在服务端创建，该连接此后直接执行原 SQL；
+        # 事务里没有其他语句时回滚后立即按原 SQL 重试一次
+        _prepared_statements[conn] = None
+        if not idle:
+            raise
+        conn.rollback()
+        cursor.execute(sql, params)
+        return
+    prepared.add(name)
 
 
 # ============================================================================
@@ -59,6 +224,8 @@ MILVUS_CONFIG = {
     'host': os.getenv('MILVUS_HOST', '127.0.0.1'),
     'port': int(os.getenv('MILVUS_PORT', '19540')),
     'collection': os.getenv('MILVUS_COLLECTION', 'case_vectors'),
+    # IVF_FLAT 存原始 float32 向量；IVF_SQ8 按 int8 标量量化，内存和每次查询读取的数据约为 1/4
+    'index_type': os.getenv('MILVUS_INDEX_TYPE', 'IVF_FLAT'),
 }
 
 
@@ -7,134 +7,507 @@
 import os
 import sys
 import json
-from typing import List, Dict, Optional, Any
+import time
+import shutil
+import atexit
+import weakref
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Tuple
 from dataclasses import dataclass, field, asdict
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils import generate_id, get_timestamp
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
-def result_to_dict(result) -> Dict:
-    """将提取结果转为字典"""
-    def loc_val_to_dict(lv):
-        if lv is None:
-            return {'value': None, 'position': {}, 'raw_text': ''}
-        return {
-            'value': lv.value,
-            'position': {
-                'table_index': lv.position.table_index,
-                'row_index': lv.position.row_index,
-                'col_index': lv.position.col_index,
-            },
-            'raw_text': lv.raw_text
-        }
+# index.log 累计多少条增量后合并回 main_index.json
+INDEX_LOG_COMPACT_THRESHOLD = 200
+# cases.jsonl 中已删除案例的字节数超过 存活字节数 × 该比例（且不少于下限）时，合并快照时重写该文件
+_CASES_LOG_COMPACT_RATIO = 0.5
+_CASES_LOG_COMPACT_MIN_BYTES = 1 << 20
+# flush 时报告文件数达到该值才用线程池并行写
+_PARALLEL_WRITE_MIN = 4
+_PARALLEL_WRITE_WORKERS = 8
+
+
+def _dumps(obj, pretty: bool = False) -> bytes:
+    """序列化为 JSON 字节（优先 orjson；pretty 时缩进 2 格，便于人工查看）"""
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(obj, option=option)
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _dumps_line(obj) -> bytes:
+    """序列化为单行 JSON 字节（用于追加日志）"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS) + b'\n'
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def _loads(data: bytes):
+    """反序列化 JSON 字节（优先 orjson）"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _write_bytes(path: str, data: bytes):
+    """直接用文件描述符整段写入（省去文件对象和缓冲层）"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+# 进程内索引缓存：main_index.json 绝对路径 -> (文件戳, 日志条数, 索引)
+_INDEX_CACHE: Dict[str, Tuple[tuple, int, Dict]] = {}
+
+
+def _copy_index(index: Dict) -> Dict:
+    """复制索引（行都是平铺的 dict，逐行浅拷贝即可，避免缓存被实例修改）"""
+    return {k: [dict(r) for r in v] if isinstance(v, list) else v for k, v in index.items()}
+
+
+def _public_row(row: Dict) -> Dict:
+    """去掉索引行中的内部字段（_offset/_length 等以 _ 开头的键）"""
+    return {k: v for k, v in row.items() if not k.startswith('_')}
+
+
+def _discard_dir(path: str):
+    """清空目录：先原子改名到 .trash 再后台删除；改名失败（如跨文件系统）则就地删除"""
+    trash = f"{path}.trash.{time.time_ns()}"
+    try:
+        os.rename(path, trash)
+    except FileNotFoundError:
+        os.makedirs(path)
+        return
+    except OSError:
+        shutil.rmtree(path)
+        os.makedirs(path)
+        return
+    os.makedirs(path)
+    threading.Thread(target=shutil.rmtree, args=(trash,), kwargs={'ignore_errors': True},
+                     daemon=True).start()
+
+
+@functools.lru_cache(maxsize=4096)
+def _read_file_bytes(path: str, mtime: float) -> bytes:
+    """读取文件内容（按 路径+mtime 缓存，文件被改写后自动失效）"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=4096)
+def _read_slice_bytes(path: str, generation: int, offset: int, length: int) -> bytes:
+    """
+    读取 JSONL 中的一行（按 路径+文件代次+偏移 缓存）
+
+    追加写入不改变已有行；压缩重写或 clear() 后是新文件（inode 不同），旧缓存不会命中
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+# 缓存的是原始字节，每次调用都重新解码：调用方拿到的是独立对象，修改嵌套字段不会污染缓存
+def _read_json(path: str, mtime: float):
+    """读取并解析 JSON 文件"""
+    return _loads(_read_file_bytes(path, mtime))
+
+
+def _read_json_slice(path: str, offset: int, length: int):
+    """读取并解析 JSONL 中的一行"""
+    return _loads(_read_slice_bytes(path, os.stat(path).st_ino, offset, length))
+
+
+# result_to_dict 用到的字段表（模块加载时确定，不再每次调用构造列表）
+_MISSING = object()
+# 案例中 LocatedValue 类型的字段
+_CASE_LOC_FIELDS = (
+    'building_area', 'transaction_price', 'rental_price',
+    'transaction_correction', 'market_correction', 'location_correction',
+    'physical_correction', 'rights_correction', 'adjusted_price',
+    'structure_factor', 'floor_factor', 'orientation_factor',
+    'age_factor', 'physical_composite', 'composite_result',
+    'vs_result', 'decoration_price', 'final_price',
+)
+# 案例中原样保存的字段
+_CASE_STR_FIELDS = (
+    'transaction_date', 'data_source', 'location', 'usage',
+    'p1_transaction', 'p2_date', 'p3_physical', 'p4_location',
+)
+# 因素字典字段
+_FACTOR_FIELDS = ('location_factors', 'physical_factors', 'rights_factors')
+# 估价对象中 LocatedValue 类型 / 原样保存的额外字段
+_SUBJECT_LOC_FIELDS = ('unit_price', 'total_price')
+_SUBJECT_STR_FIELDS = ('structure', 'floor', 'usage', 'cert_no', 'owner', 'location_code')
+# 提取结果中 LocatedValue 类型的最终结果字段
+_RESULT_LOC_FIELDS = ('final_unit_price', 'final_total_price')
+
+# 索引行扩展字段 (字段名, 缺省值)
+_REPORT_INDEX_FIELDS = (
+    ('district', ''), ('street', ''), ('usage', ''), ('build_year', 0),
+    ('total_floor', 0), ('current_floor', 0), ('structure', ''),
+    ('value_date', ''), ('appraisal_purpose', ''),
+)
+_CASE_INDEX_FIELDS = (
+    ('district', ''), ('street', ''), ('usage', ''), ('build_year', 0),
+    ('total_floor', 0), ('current_floor', 0), ('structure', ''),
+    ('orientation', ''), ('decoration', ''), ('transaction_date', ''),
+)
+# 案例价格字段（按优先级）
+_CASE_PRICE_FIELDS = ('transaction_price', 'rental_price', 'final_price')
+
+# 案例索引中单独按列保存、用于过滤的字段
+_CASE_COLUMNS = ('report_type',)
+
+
+def _loc_val_to_dict(lv) -> Dict:
+    """LocatedValue 转字典"""
+    if lv is None:
+        return {'value': None, 'position': {}, 'raw_text': ''}
+    pos = lv.position
+    return {
+        'value': lv.value,
+        'position': {'table_index': pos.table_index, 'row_index': pos.row_index, 'col_index': pos.col_index},
+        'raw_text': lv.raw_text,
+    }
+
+
+def _factor_to_dict(f) -> Dict:
+    """Factor 转字典"""
+    return {
+        'name': f.name,
+        'description': f.description,
+        'level': f.level,
+        'index': f.index,
+    }
+
+
+def _case_to_dict(case) -> Dict:
+    """案例转字典"""
+    data = {
+        'case_id': case.case_id,
+        'address': _loc_val_to_dict(case.address),
+    }
     
-    def factor_to_dict(f):
-        return {
-            'name': f.name,
-            'description': f.description,
-            'level': f.level,
-            'index': f.index,
-        }
+    # 通用字段
+    for name in _CASE_LOC_FIELDS:
+        val = getattr(case, name, _MISSING)
+        if val is not _MISSING and hasattr(val, 'value'):
+            data[name] = _loc_val_to_dict(val)
     
-    def case_to_dict(case):
-        data = {
-            'case_id': case.case_id,
-            'address': loc_val_to_dict(case.address),
-        }
-        
-        # 通用字段
-        for field in ['building_area', 'transaction_price', 'rental_price',
-                      'transaction_correction', 'market_correction', 'location_correction',
-                      'physical_correction', 'rights_correction', 'adjusted_price',
-                      'structure_factor', 'floor_factor', 'orientation_factor',
-                      'age_factor', 'physical_composite', 'composite_result',
-                      'vs_result', 'decoration_price', 'final_price']:
-            if hasattr(case, field):
-                val = getattr(case, field)
-                if hasattr(val, 'value'):
-                    data[field] = loc_val_to_dict(val)
-        
-        # 字符串字段
-        for field in ['transaction_date', 'data_source', 'location', 'usage',
-                      'p1_transaction', 'p2_date', 'p3_physical', 'p4_location']:
-            if hasattr(case, field):
-                data[field] = getattr(case, field)
-        
-        # 因素
-        for factor_type in ['location_factors', 'physical_factors', 'rights_factors']:
-            if hasattr(case, factor_type):
-                factors = getattr(case, factor_type)
-                if factors:
-                    data[factor_type] = {k: factor_to_dict(v) for k, v in factors.items()}
-        
-        return data
+    # 字符串字段
+    for name in _CASE_STR_FIELDS:
+        val = getattr(case, name, _MISSING)
+        if val is not _MISSING:
+            data[name] = val
+    
+    # 因素
+    for name in _FACTOR_FIELDS:
+        factors = getattr(case, name, None)
+        if factors:
+            data[name] = {k: _factor_to_dict(v) for k, v in factors.items()}
     
-    # 主体
+    return data
+
+
+def result_to_dict(result) -> Dict:
+    """将提取结果转为字典"""
+    # 估价对象：一次遍历字段表
+    subject = result.subject
+    subject_data = {
+        'address': _loc_val_to_dict(subject.address),
+        'building_area': _loc_val_to_dict(subject.building_area),
+    }
+    for name in _SUBJECT_LOC_FIELDS:
+        if (val := getattr(subject, name, _MISSING)) is not _MISSING:
+            subject_data[name] = _loc_val_to_dict(val)
+    for name in _SUBJECT_STR_FIELDS:
+        if (val := getattr(subject, name, _MISSING)) is not _MISSING:
+            subject_data[name] = val
+
     data = {
         'source_file': result.source_file,
-        'subject': {
-            'address': loc_val_to_dict(result.subject.address),
-            'building_area': loc_val_to_dict(result.subject.building_area),
-        },
-        'cases': [case_to_dict(c) for c in result.cases],
+        'subject': subject_data,
+        'cases': [_case_to_dict(c) for c in result.cases],
     }
     
-    # 估价对象额外字段
-    subject = result.subject
-    for field in ['unit_price', 'total_price']:
-        if hasattr(subject, field):
-            data['subject'][field] = loc_val_to_dict(getattr(subject, field))
-    
-    for field in ['structure', 'floor', 'usage', 'cert_no', 'owner', 'location_code']:
-        if hasattr(subject, field):
-            data['subject'][field] = getattr(subject, field)
-    
     # 最终结果
-    if hasattr(result, 'final_unit_price'):
-        data['final_unit_price'] = loc_val_to_dict(result.final_unit_price)
-    if hasattr(result, 'final_total_price'):
-        data['final_total_price'] = loc_val_to_dict(result.final_total_price)
-    if hasattr(result, 'floor_factor'):
-        data['floor_factor'] = result.floor_factor
+    for name in _RESULT_LOC_FIELDS:
+        if (val := getattr(result, name, _MISSING)) is not _MISSING:
+            data[name] = _loc_val_to_dict(val)
+    if (val := getattr(result, 'floor_factor', _MISSING)) is not _MISSING:
+        data['floor_factor'] = val
     
     return data
 
 
+# 仍存活的知识库实例（弱引用，实例被回收后自动移除）：进程退出时统一 flush
+_LIVE_MANAGERS: "weakref.WeakSet" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_at_exit():
+    """进程退出时写出各实例仍在缓冲区里的报告"""
+    for manager in list(_LIVE_MANAGERS):
+        manager.flush()
+
+
 class KnowledgeBaseManager:
     """知识库管理器"""
     
-    def __init__(self, base_path: str = "./knowledge_base/storage", enable_vector: bool = True):
+    def __init__(self, base_path: str = "./knowledge_base/storage", enable_vector: bool = True,
+                 eager_vector: bool = False, buffer_limit: int = 1, flush_interval: float = 5.0,
+                 backend: str = 'json', pretty: bool = False):
+        """
+        Args:
+            base_path: 存储目录
+            enable_vector: 是否启用向量检索
+            eager_vector: 是否在构造时就加载向量存储。默认 False：入库/查询索引不会触发
+                          向量依赖的导入，只有检索（vector_store 属性）或显式 force 重建才加载
+            buffer_limit: add_report 缓冲多少份报告后写盘；默认 1 即每次立即写盘，
+                          批量入库可调大，最后调用 flush()/close()（进程退出时也会自动 flush）
+            flush_interval: 缓冲最长保留秒数，超过后下一次 add_report 时写盘
+            backend: 索引后端。'json' 为内存索引 + main_index.json；'sqlite' 把索引行存入
+                     index/index.db（适合案例数很大的知识库），首次启用时从 JSON 索引导入，
+                     之后 JSON 索引不再更新
+            pretty: 报告文件和索引快照是否缩进输出（调试用）；默认紧凑输出
+        """
+        if backend not in ('json', 'sqlite'):
+            raise ValueError(f"不支持的索引后端: {backend}")
         self.base_path = base_path
         self.reports_path = os.path.join(base_path, "reports")
         self.cases_path = os.path.join(base_path, "cases")
         self.index_path = os.path.join(base_path, "index")
+        # 案例数据：追加写入的 JSONL（旧版本每个案例一个 {case_id}.json，读取时兼容）
+        self.cases_log = os.path.join(self.cases_path, "cases.jsonl")
+        # 索引：main_index.json 为快照，index.log 为其后的增量（加载时回放，累计过多时合并）
+        self.index_file = os.path.join(self.index_path, "main_index.json")
+        self.index_log = os.path.join(self.index_path, "index.log")
+        self._log_entries = 0
         self.enable_vector = enable_vector
+        self.pretty = pretty
+
+        # 写缓冲：doc_id -> (report_row, report_bytes, case_rows, case_lines)
+        self.buffer_limit = max(1, buffer_limit)
+        self.flush_interval = flush_interval
+        self._pending_reports: Dict[str, tuple] = {}
+        # 缓冲中的案例：case_id -> 序列化后的行（读取时解码，调用方拿到独立对象）
+        self._pending_cases: Dict[str, bytes] = {}
+        self._pending_since: Optional[float] = None
+        _LIVE_MANAGERS.add(self)
         
         # 创建目录
         for path in [self.reports_path, self.cases_path, self.index_path]:
             os.makedirs(path, exist_ok=True)
         
         # 加载索引
-        self.index = self._load_index()
+        self._sqlite = None
+        self._index: Optional[Dict] = None
+        if backend == 'sqlite':
+            self._open_sqlite_index()
+        else:
+            self.index = self._load_index()
+        # case_id -> index['cases'] 下标，get_case O(1) 查找
+        self._case_index: Dict[str, int] = {}
+        # 案例过滤列（与 index['cases'] 按下标对齐），过滤时只扫这一列
+        self._case_columns: Dict[str, List] = {name: [] for name in _CASE_COLUMNS}
+        # doc_id -> 该报告案例在 index['cases'] 中的下标
+        self._cases_by_doc: Dict[str, List[int]] = {}
+        # doc_id -> 报告索引行（报告头信息，不读报告文件）
+        self._reports_by_id: Dict[str, Dict] = {}
+        # sqlite 后端按 index.db 查找，不用这些映射（构建它们会把全部索引行读进内存）
+        if self._sqlite is None:
+            self._rebuild_case_lookup()
 
         # 向量存储（延时初始化）
         self._vector_store = None
+        if eager_vector:
+            _ = self.vector_store
     
+    @property
+    def index(self) -> Dict:
+        """内存索引；sqlite 后端时按需从 index.db 读出（供直接读 index 的调用方，如 kb_query）"""
+        if self._index is None:
+            self.flush()
+            self._index = {'reports': self._sqlite.list_reports(), 'cases': self._sqlite.list_cases()}
+        return self._index
+
+    @index.setter
+    def index(self, value: Dict):
+        self._index = value
+
+    def _open_sqlite_index(self):
+        """打开 SQLite 索引；库为空且存在 JSON 索引时先导入"""
+        from .sqlite_index import SqliteIndex
+        self._sqlite = SqliteIndex(os.path.join(self.index_path, "index.db"))
+        if self._sqlite.is_empty() and (os.path.exists(self.index_file) or os.path.exists(self.index_log)):
+            legacy = self._load_index()
+            self._sqlite.add(legacy.get('reports', []), legacy.get('cases', []))
+            print(f"📥 JSON 索引已导入 SQLite: {len(legacy.get('cases', []))} 个案例")
+
+    def _index_stamp(self):
+        """快照和增量日志的 (mtime_ns, size)，任一变化即认为索引已变"""
+        stamp = []
+        for path in (self.index_file, self.index_log):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
     def _load_index(self) -> Dict:
-        """加载索引"""
-        index_file = os.path.join(self.index_path, "main_index.json")
-        if os.path.exists(index_file):
-            with open(index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {'reports': [], 'cases': []}
-    
+        """加载索引（快照 + 回放增量日志；文件未变时直接复用进程内缓存）"""
+        key = os.path.abspath(self.index_file)
+        stamp = self._index_stamp()
+        cached = _INDEX_CACHE.get(key)
+        if cached is not None and cached[0] == stamp:
+            self._log_entries = cached[1]
+            return _copy_index(cached[2])
+
+        # 文件戳里已有 stat 结果，不存在的文件直接跳过
+        snapshot_stamp, log_stamp = stamp
+        index = {'reports': [], 'cases': []}
+        if snapshot_stamp is not None:
+            with open(self.index_file, 'rb') as f:
+                index = _loads(f.read())
+
+        self._log_entries = 0
+        if log_stamp is not None:
+            with open(self.index_log, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = _loads(line)
+                    except ValueError:
+                        # 进程中断可能留下半行，忽略
+                        continue
+                    self._apply_delta(index, entry)
+                    self._log_entries += 1
+
+        _INDEX_CACHE[key] = (stamp, self._log_entries, _copy_index(index))
+        return index
+
     def _save_index(self):
-        """保存索引"""
-        index_file = os.path.join(self.index_path, "main_index.json")
-        with open(index_file, 'w', encoding='utf-8') as f:
-            json.dump(self.index, f, ensure_ascii=False, indent=2)
+        """保存索引快照，并清空增量日志（快照里的案例行必须已有 _offset，先 flush）"""
+        self.flush()
+        cases = self.index.get('cases', [])
+        if self._cases_log_has_garbage(sum(row.get('_length', 0) for row in cases)):
+            moved = self._rewrite_cases_log(cases)
+            for row in cases:
+                if row['case_id'] in moved:
+                    row['_offset'] = moved[row['case_id']]
+        tmp_file = self.index_file + '.tmp'
+        _write_bytes(tmp_file, _dumps(self.index, self.pretty))
+        os.replace(tmp_file, self.index_file)
+
+        try:
+            os.remove(self.index_log)
+        except FileNotFoundError:
+            pass
+        self._log_entries = 0
+        _INDEX_CACHE[os.path.abspath(self.index_file)] = (self._index_stamp(), 0, _copy_index(self.index))
+
+    def _cases_log_has_garbage(self, live_bytes: int) -> bool:
+        """cases.jsonl 中已删除案例占用的字节是否多到需要重写"""
+        try:
+            dead = os.path.getsize(self.cases_log) - live_bytes
+        except FileNotFoundError:
+            return False
+        return dead >= _CASES_LOG_COMPACT_MIN_BYTES and dead > live_bytes * _CASES_LOG_COMPACT_RATIO
+
+    def _rewrite_cases_log(self, rows) -> Dict[str, int]:
+        """只把 rows 引用的案例行按顺序重写为新的 cases.jsonl，返回 case_id -> 新偏移（长度不变）"""
+        tmp_file = self.cases_log + '.tmp'
+        moved = {}
+        with open(self.cases_log, 'rb') as src, open(tmp_file, 'wb') as dst:
+            for row in rows:
+                offset = row.get('_offset')
+                if offset is None:
+                    continue
+                src.seek(offset)
+                moved[row['case_id']] = dst.tell()
+                dst.write(src.read(row['_length']))
+        os.replace(tmp_file, self.cases_log)
+        # 偏移全部改变，旧偏移的缓存作废
+        _read_slice_bytes.cache_clear()
+        return moved
+
+    def _rebuild_case_lookup(self):
+        """重建 case_id -> 下标 映射、过滤列和报告行映射（删除会使下标整体移动，需要重建）"""
+        self._reports_by_id = {r['doc_id']: r for r in self.index.get('reports', [])}
+        cases = self.index.get('cases', [])
+        self._case_index = {c['case_id']: i for i, c in enumerate(cases)}
+        self._case_columns = {name: [c.get(name) for c in cases] for name in _CASE_COLUMNS}
+        self._cases_by_doc = {}
+        for i, c in enumerate(cases):
+            self._cases_by_doc.setdefault(c.get('from_doc'), []).append(i)
+
+    def _extend_case_lookup(self, case_rows: List[Dict]):
+        """追加案例行后增量更新映射和过滤列"""
+        base = len(self.index['cases'])
+        self.index['cases'].extend(case_rows)
+        for i, row in enumerate(case_rows, base):
+            self._case_index[row['case_id']] = i
+            self._cases_by_doc.setdefault(row.get('from_doc'), []).append(i)
+        for name, column in self._case_columns.items():
+            column.extend(row.get(name) for row in case_rows)
+
+    @staticmethod
+    def _apply_delta(index: Dict, entry: Dict):
+        """把一条增量应用到索引上（回放用，重复回放也不会出错）"""
+        op = entry.get('op')
+        if op == 'add':
+            report = entry['report']
+            if any(r.get('doc_id') == report['doc_id'] for r in index['reports']):
+                return
+            index['reports'].append(report)
+            index['cases'].extend(entry.get('cases', []))
+        elif op == 'delete':
+            doc_id = entry['doc_id']
+            index['reports'] = [r for r in index['reports'] if r.get('doc_id') != doc_id]
+            index['cases'] = [c for c in index['cases'] if c.get('from_doc') != doc_id]
+
+    def _append_delta(self, entry: Dict):
+        """追加一条索引增量"""
+        self._append_deltas([entry])
+
+    def _append_deltas(self, entries: List[Dict]):
+        """一次性追加多条索引增量；累计超过阈值时合并为快照"""
+        with open(self.index_log, 'ab') as f:
+            f.write(b''.join(_dumps_line(entry) for entry in entries))
+        self._log_entries += len(entries)
+        if self._log_entries > INDEX_LOG_COMPACT_THRESHOLD:
+            self._save_index()
+
+    def close(self):
+        """写出缓冲数据，并把未合并的增量写回索引快照"""
+        self.flush()
+        if self._sqlite is not None:
+            self._compact_sqlite_cases_log()
+        elif self._log_entries:
+            self._save_index()
+
+    def _compact_sqlite_cases_log(self):
+        """sqlite 后端：已删除案例占用过多时重写 cases.jsonl 并回写新偏移"""
+        if self._cases_log_has_garbage(self._sqlite.case_bytes()):
+            self._sqlite.update_offsets(self._rewrite_cases_log(self._sqlite.iter_cases()))
 
     @property
     def vector_store(self):
@@ -152,9 +525,19 @@ class KnowledgeBaseManager:
                 return None
         return self._vector_store
 
-    def rebuild_vector_index(self):
-        """重建向量索引"""
-        if not self.enable_vector or self.vector_store is None:
+    def rebuild_vector_index(self, force: bool = False):
+        """
+        重建向量索引
+
+        Args:
+            force: 向量存储尚未加载时是否加载它；默认不加载，避免入库路径引入模型依赖
+        """
+        if not self.enable_vector:
+            print("⚠️ 向量存储不可用")
+            return
+        if self._vector_store is None and not force:
+            return
+        if self.vector_store is None:
             print("⚠️ 向量存储不可用")
             return
 
@@ -169,9 +552,11 @@ class KnowledgeBaseManager:
         # 重建索引
         self.vector_store.rebuild(cases)
 
-    def ensure_vector_index(self):
+    def ensure_vector_index(self, force: bool = False):
         """确保向量索引是最新的（如果需要重建则重建）"""
-        if not self.enable_vector or self.vector_store is None:
+        if not self.enable_vector or (self._vector_store is None and not force):
+            return
+        if self.vector_store is None:
             return
 
         if self.vector_store.is_dirty:
@@ -189,149 +574,281 @@ class KnowledgeBaseManager:
             doc_id
         """
         doc_id = generate_id("doc")
+        now = get_timestamp()
         
-        # 转为字典
+        # 转为字典（只转换一次，案例直接复用 data['cases']）
         data = result_to_dict(result)
         data['doc_id'] = doc_id
         data['report_type'] = report_type
-        data['extract_time'] = get_timestamp()
-        
-        # 保存报告
-        report_file = os.path.join(self.reports_path, f"{doc_id}.json")
-        with open(report_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        data['extract_time'] = now
         
+        # 报告 JSON 在补充案例字段之前序列化（保持报告文件内容不变）
+        report_bytes = _dumps(data, self.pretty)
+
         # 添加到索引（扩展字段）
         subject = result.subject
-        self.index['reports'].append({
+        report_row = {
             'doc_id': doc_id,
             'report_type': report_type,
             'source_file': result.source_file,
             'address': subject.address.value or '',
             'area': subject.building_area.value or 0,
             'case_count': len(result.cases),
-            'create_time': get_timestamp(),
-            # 扩展字段
-            'district': getattr(subject, 'district', ''),
-            'street': getattr(subject, 'street', ''),
-            'usage': getattr(subject, 'usage', ''),
-            'build_year': getattr(subject, 'build_year', 0),
-            'total_floor': getattr(subject, 'total_floor', 0),
-            'current_floor': getattr(subject, 'current_floor', 0),
-            'structure': getattr(subject, 'structure', ''),
-            'value_date': getattr(subject, 'value_date', ''),
-            'appraisal_purpose': getattr(subject, 'appraisal_purpose', ''),
-        })
-        
-        # 保存案例并添加到索引
-        for case in result.cases:
-            case_id = f"{doc_id}_case_{case.case_id}"
-            case_data = result_to_dict(result)['cases'][result.cases.index(case)]
+            'create_time': now,
+        }
+        # 扩展字段
+        report_row.update({name: getattr(subject, name, default) for name, default in _REPORT_INDEX_FIELDS})
+
+        # 案例（写盘前先进缓冲区，_offset/_length 在 flush 时回填）
+        case_rows = []
+        case_lines = []
+        prefix = doc_id + '_case_'
+        for case, case_data in zip(result.cases, data['cases']):
+            label = case.case_id
+            case_id = prefix + (label if isinstance(label, str) else str(label))
             case_data['case_id_full'] = case_id
             case_data['from_doc'] = doc_id
             case_data['report_type'] = report_type
-            
-            case_file = os.path.join(self.cases_path, f"{case_id}.json")
-            with open(case_file, 'w', encoding='utf-8') as f:
-                json.dump(case_data, f, ensure_ascii=False, indent=2)
-            
-            # 获取价格
-            price = 0
-            if hasattr(case, 'transaction_price') and case.transaction_price.value:
-                price = case.transaction_price.value
-            elif hasattr(case, 'rental_price') and case.rental_price.value:
-                price = case.rental_price.value
-            elif hasattr(case, 'final_price') and case.final_price.value:
-                price = case.final_price.value
-            
-            # 获取面积
-            area = case.building_area.value if case.building_area.value else 0
-            
-            # 解析交易日期为标准格式
-            transaction_date = getattr(case, 'transaction_date', '')
-            
-            self.index['cases'].append({
-                'case_id': case_id,
-                'case_label': case.case_id,
-                'from_doc': doc_id,
-                'report_type': report_type,
-                'address': case.address.value or '',
-                'area': area,
-                'price': price,
-                # 扩展字段
-                'district': getattr(case, 'district', ''),
-                'street': getattr(case, 'street', ''),
-                'usage': getattr(case, 'usage', ''),
-                'build_year': getattr(case, 'build_year', 0),
-                'total_floor': getattr(case, 'total_floor', 0),
-                'current_floor': getattr(case, 'current_floor', 0),
-                'structure': getattr(case, 'structure', ''),
-                'orientation': getattr(case, 'orientation', ''),
-                'decoration': getattr(case, 'decoration', ''),
-                'transaction_date': transaction_date,
-            })
-        
-        self._save_index()
+
+            line = _dumps_line(case_data)
+            case_lines.append(line)
+            case_rows.append(self._build_case_row(case, case_id, doc_id, report_type))
+            self._pending_cases[case_id] = line
+
+        # 内存索引立即可见，落盘交给 flush（sqlite 后端读取前会先 flush）
+        if self._sqlite is None:
+            self.index['reports'].append(report_row)
+            self._reports_by_id[doc_id] = report_row
+            self._extend_case_lookup(case_rows)
+        else:
+            self._index = None
+
+        self._pending_reports[doc_id] = (report_row, report_bytes, case_rows, case_lines)
+        self._maybe_flush()
 
         # 标记向量索引需要重建
         if self.enable_vector and self._vector_store is not None:
             self._vector_store.mark_dirty()
 
         return doc_id
+
+    def _maybe_flush(self):
+        """缓冲报告数达到上限或距首次缓冲超过 flush_interval 秒时写盘"""
+        if not self._pending_reports:
+            return
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        if (len(self._pending_reports) >= self.buffer_limit
+                or time.monotonic() - self._pending_since >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """把缓冲的报告/案例写盘：报告文件各一个，案例一次性追加到 cases.jsonl，索引增量一次追加"""
+        if not self._pending_reports:
+            return
+
+        # 先清空缓冲区：后面追加增量可能触发合并快照（_save_index 会先 flush）
+        pending = list(self._pending_reports.values())
+        self._pending_reports.clear()
+        self._pending_since = None
+
+        # 报告文件互相独立，缓冲较多时并行写（write 会释放 GIL）
+        report_writes = [
+            (os.path.join(self.reports_path, f"{report_row['doc_id']}.json"), report_bytes)
+            for report_row, report_bytes, _, _ in pending
+        ]
+        if len(report_writes) >= _PARALLEL_WRITE_MIN:
+            with ThreadPoolExecutor(max_workers=min(_PARALLEL_WRITE_WORKERS, len(report_writes))) as ex:
+                list(ex.map(lambda item: _write_bytes(*item), report_writes))
+        else:
+            for path, report_bytes in report_writes:
+                _write_bytes(path, report_bytes)
+
+        with open(self.cases_log, 'ab') as case_log:
+            for _, _, case_rows, case_lines in pending:
+                for row, line in zip(case_rows, case_lines):
+                    row['_offset'] = case_log.tell()
+                    row['_length'] = len(line)
+                    case_log.write(line)
+
+        if self._sqlite is not None:
+            self._sqlite.add(
+                [report_row for report_row, _, _, _ in pending],
+                [row for _, _, case_rows, _ in pending for row in case_rows],
+            )
+            self._index = None
+        else:
+            self._append_deltas([
+                {'op': 'add', 'report': report_row, 'cases': case_rows}
+                for report_row, _, case_rows, _ in pending
+            ])
+        self._pending_cases.clear()
+
+    @staticmethod
+    def _build_case_row(case, case_id: str, doc_id: str, report_type: str) -> Dict:
+        """构建案例索引行（写盘后补上 _offset/_length，指向 cases.jsonl 中的那一行）"""
+        # 价格：按优先级取第一个有值的价格字段
+        price = 0
+        for name in _CASE_PRICE_FIELDS:
+            val = getattr(case, name, None)
+            if val is not None and val.value:
+                price = val.value
+                break
+
+        row = {
+            'case_id': case_id,
+            'case_label': case.case_id,
+            'from_doc': doc_id,
+            'report_type': report_type,
+            'address': case.address.value or '',
+            'area': case.building_area.value or 0,
+            'price': price,
+        }
+        # 扩展字段
+        row.update({name: getattr(case, name, default) for name, default in _CASE_INDEX_FIELDS})
+        return row
     
     def get_report(self, doc_id: str) -> Optional[Dict]:
         """获取报告"""
+        pending = self._pending_reports.get(doc_id)
+        if pending is not None:
+            return _loads(pending[1])
+
         report_file = os.path.join(self.reports_path, f"{doc_id}.json")
-        if os.path.exists(report_file):
-            with open(report_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+        try:
+            mtime = os.path.getmtime(report_file)
+        except FileNotFoundError:
+            return None
+        return _read_json(report_file, mtime)
+
+    def get_report_header(self, doc_id: str) -> Optional[Dict]:
+        """获取报告头信息（索引行：类型、地址、面积、案例数等），不读取报告文件"""
+        if self._sqlite is not None:
+            self.flush()
+            return self._sqlite.get_report(doc_id)
+        row = self._reports_by_id.get(doc_id)
+        return dict(row) if row is not None else None
 
     def get_case(self, case_id: str) -> Optional[Dict]:
-        """获取单个案例详情"""
-        for doc_id, report in self.index.get("reports", {}).items():
-            for case in report.get("cases", []):
-                if case.get("case_id") == case_id:
-                    return {
-                        "case_id": case_id,
-                        "doc_id": doc_id,
-                        "report_type": report.get("report_type"),
-                        **case,
-                    }
-        return None
+        """获取单个案例详情（索引字段 + 完整案例数据）"""
+        if self._sqlite is not None:
+            self.flush()
+            row = self._sqlite.get_case(case_id)
+            if row is None:
+                return None
+        else:
+            idx = self._case_index.get(case_id)
+            if idx is None:
+                return None
+            row = self.index['cases'][idx]
+
+        case_data = self._read_case_data(row)
+        if case_data is None and '_offset' in row:
+            # 偏移可能已失效（cases.jsonl 被其他实例压缩重写）：重新读取索引行后再试一次
+            row = self._reload_case_row(case_id)
+            if row is not None:
+                case_data = self._read_case_data(row)
+        if case_data is None:
+            return None
+
+        case = _public_row(row)
+        case.update(case_data)
+        case['case_id'] = case_id
+        case['doc_id'] = row.get('from_doc')
+        return case
+
+    def get_cases(self, case_ids: List[str]) -> List[Dict]:
+        """批量获取案例详情，按 case_ids 顺序返回，不存在的跳过"""
+        return [case for case in map(self.get_case, case_ids) if case is not None]
+
+    def _reload_case_row(self, case_id: str) -> Optional[Dict]:
+        """重新加载索引（json 后端按文件戳重读快照和增量日志）后取案例索引行"""
+        if self._sqlite is not None:
+            return self._sqlite.get_case(case_id)
+        self.flush()
+        self.index = self._load_index()
+        self._rebuild_case_lookup()
+        idx = self._case_index.get(case_id)
+        return self.index['cases'][idx] if idx is not None else None
+
+    def _read_case_data(self, row: Dict) -> Optional[Dict]:
+        """按索引行读取案例数据：缓冲区 > cases.jsonl 偏移读取 > 旧数据 {case_id}.json"""
+        pending = self._pending_cases.get(row['case_id'])
+        if pending is not None:
+            return _loads(pending)
+
+        offset = row.get('_offset')
+        if offset is not None:
+            try:
+                data = _read_json_slice(self.cases_log, offset, row['_length'])
+            except (FileNotFoundError, ValueError):
+                return None
+            # 偏移失效时可能读到别的案例或半行：核对 case_id，不一致视为未读到
+            if not isinstance(data, dict) or data.get('case_id_full', row['case_id']) != row['case_id']:
+                return None
+            return data
+
+        case_file = os.path.join(self.cases_path, f"{row['case_id']}.json")
+        try:
+            return _read_json(case_file, os.path.getmtime(case_file))
+        except FileNotFoundError:
+            return None
     
     def list_reports(self, report_type: str = None) -> List[Dict]:
         """列出报告"""
+        if self._sqlite is not None:
+            self.flush()
+            return self._sqlite.list_reports(report_type)
         reports = self.index.get('reports', [])
         if report_type:
             reports = [r for r in reports if r.get('report_type') == report_type]
         return reports
     
     def list_cases(self, report_type: str = None) -> List[Dict]:
-        """列出案例"""
+        """列出案例（按 report_type 过滤时只扫描过滤列，再按下标取行；不含 _offset 等内部字段）"""
+        if self._sqlite is not None:
+            self.flush()
+            return [_public_row(row) for row in self._sqlite.list_cases(report_type)]
         cases = self.index.get('cases', [])
-        if report_type:
-            cases = [c for c in cases if c.get('report_type') == report_type]
-        return cases
+        if not report_type:
+            return [_public_row(row) for row in cases]
+
+        column = self._case_columns['report_type']
+        return [_public_row(cases[i]) for i, rt in enumerate(column) if rt == report_type]
     
     def delete_report(self, doc_id: str) -> bool:
         """删除报告及其案例"""
+        # 还在缓冲区里的报告直接丢弃
+        pending = self._pending_reports.pop(doc_id, None)
+        if pending is not None:
+            for row in pending[2]:
+                self._pending_cases.pop(row['case_id'], None)
+
         # 删除报告文件
-        report_file = os.path.join(self.reports_path, f"{doc_id}.json")
-        if os.path.exists(report_file):
-            os.remove(report_file)
-        
-        # 删除案例文件
-        for case in self.index.get('cases', []):
-            if case.get('from_doc') == doc_id:
-                case_file = os.path.join(self.cases_path, f"{case['case_id']}.json")
-                if os.path.exists(case_file):
-                    os.remove(case_file)
-        
-        # 更新索引
-        self.index['reports'] = [r for r in self.index.get('reports', []) if r.get('doc_id') != doc_id]
-        self.index['cases'] = [c for c in self.index.get('cases', []) if c.get('from_doc') != doc_id]
-        self._save_index()
+        try:
+            os.remove(os.path.join(self.reports_path, f"{doc_id}.json"))
+        except FileNotFoundError:
+            pass
+
+        if self._sqlite is not None:
+            self._remove_case_files(self._sqlite.delete_report(doc_id))
+            self._index = None
+            self._compact_sqlite_cases_log()
+        else:
+            # 只处理本报告的案例
+            cases = self.index.get('cases', [])
+            positions = self._cases_by_doc.pop(doc_id, [])
+            self._remove_case_files(cases[i] for i in positions)
+
+            # 更新索引：同一报告的案例通常连续，直接切片删除
+            self.index['reports'] = [r for r in self.index.get('reports', []) if r.get('doc_id') != doc_id]
+            if positions and positions[-1] - positions[0] + 1 == len(positions):
+                del cases[positions[0]:positions[-1] + 1]
+            elif positions:
+                dead = set(positions)
+                self.index['cases'] = [c for i, c in enumerate(cases) if i not in dead]
+            self._rebuild_case_lookup()
+            self._append_delta({'op': 'delete', 'doc_id': doc_id})
 
         # 标记向量索引需要重建
         if self.enable_vector and self._vector_store is not None:
@@ -339,42 +856,57 @@ class KnowledgeBaseManager:
         
         return True
     
+    def _remove_case_files(self, rows):
+        """删除旧版 {case_id}.json 案例文件（cases.jsonl 中的行在合并快照 / 删除报告时回收）"""
+        for row in rows:
+            if '_offset' not in row:
+                try:
+                    os.remove(os.path.join(self.cases_path, f"{row['case_id']}.json"))
+                except FileNotFoundError:
+                    pass
+
     def stats(self) -> Dict:
         """统计信息"""
-        reports = self.index.get('reports', [])
-        cases = self.index.get('cases', [])
-        
-        by_type = {}
-        for r in reports:
-            t = r.get('report_type', 'unknown')
-            by_type[t] = by_type.get(t, 0) + 1
+        if self._sqlite is not None:
+            self.flush()
+            counts = self._sqlite.counts()
+        else:
+            reports = self.index.get('reports', [])
+            by_type = {}
+            for r in reports:
+                t = r.get('report_type', 'unknown')
+                by_type[t] = by_type.get(t, 0) + 1
+            counts = {
+                'total_reports': len(reports),
+                'total_cases': len(self.index.get('cases', [])),
+                'by_type': by_type,
+            }
 
         # 向量索引状态
         vector_stats = {}
         if self.enable_vector and self._vector_store is not None:
             vector_stats = self._vector_store.get_stats()
         
-        return {
-            'total_reports': len(reports),
-            'total_cases': len(cases),
-            'by_type': by_type,
-            'vector_index': vector_stats,
-        }
+        return {**counts, 'vector_index': vector_stats}
     
     def clear(self):
-        """清空知识库"""
-        import shutil
+        """清空知识库（旧目录改名后在后台删除，本方法不等待逐个 unlink）"""
+        self._pending_reports.clear()
+        self._pending_cases.clear()
+        self._pending_since = None
         for path in [self.reports_path, self.cases_path]:
-            if os.path.exists(path):
-                shutil.rmtree(path)
-                os.makedirs(path)
-        self.index = {'reports': [], 'cases': []}
-        self._save_index()
+            _discard_dir(path)
+        if self._sqlite is not None:
+            self._sqlite.clear()
+            self._index = None
+        else:
+            self.index = {'reports': [], 'cases': []}
+            self._rebuild_case_lookup()
+            self._save_index()
+        # cases.jsonl 重新开始写，旧偏移的缓存全部作废
+        _read_slice_bytes.cache_clear()
 
         # 清空向量索引
         if self.enable_vector and self._vector_store is not None:
-            vectors_path = os.path.join(self.base_path, 'vectors')
-            if os.path.exists(vectors_path):
-                shutil.rmtree(vectors_path)
-                os.makedirs(vectors_path)
+            _discard_dir(os.path.join(self.base_path, 'vectors'))
             self._vector_store.mark_dirty()
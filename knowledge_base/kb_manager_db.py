@@ -7,158 +7,246 @@
 import os
 import sys
 import json
-from typing import List, Dict, Optional, Any
+import functools
+import dataclasses
+from typing import List, Dict, Optional, Any, Iterator
 from dataclasses import dataclass, field, asdict
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils import generate_id, get_timestamp, parse_ratio_to_float, parse_floor_string, format_p_value_display
-from .db_connection import pg_cursor, test_pg_connection
+from .db_connection import pg_cursor, test_pg_connection, execute_prepared
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+# orjson>=3.9 支持嵌入预先序列化好的片段
+HAS_ORJSON_FRAGMENT = HAS_ORJSON and hasattr(orjson, 'Fragment')
+
+# cases 表插入列（add_report 构造的案例行按此顺序）
+_CASE_INSERT_COLUMNS = (
+    'case_id', 'case_id_full', 'doc_id', 'report_type', 'address',
+    'district', 'street', 'area', 'price', 'usage', 'build_year',
+    'total_floor', 'current_floor', 'orientation', 'decoration',
+    'structure', 'case_data',
+)
+# execute_values 每条语句携带的行数
+_CASE_INSERT_PAGE_SIZE = 500
+# 案例价格列依次取这些字段的第一个非空值；可比实例组只取成交价
+_CASE_PRICE_FIELDS = ('transaction_price', 'rental_price', 'final_price')
+_GROUP_CASE_PRICE_FIELDS = ('transaction_price',)
+# 待同步的案例数超过总数的该比例时整体重建向量索引，否则只增量插入/删除
+_VECTOR_REBUILD_RATIO = 0.1
+
+
+def _json_dumps(obj) -> str:
+    """序列化 metadata/case_data（优先 orjson）"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _json_fragment(encoded: str):
+    """把已序列化的 JSON 包成 orjson.Fragment，外层序列化时原样嵌入；不支持时返回 None"""
+    if HAS_ORJSON_FRAGMENT:
+        return orjson.Fragment(encoded)
+    return None
+
+
+def _json_extend(encoded: str, extra: Dict) -> str:
+    """在已序列化的 JSON 对象末尾追加字段（不重新编码整个对象）"""
+    if encoded == '{}':
+        return _json_dumps(extra)
+    return encoded[:-1] + ',' + _json_dumps(extra)[1:]
+
+
+# 案例字段表（result_to_dict 按顺序输出）
+def _case_price(case, fields) -> Any:
+    """按 fields 顺序取案例的第一个非空价格，都没有时为 0"""
+    for name in fields:
+        val = getattr(case, name, None)
+        if val is not None and val.value:
+            return val.value
+    return 0
+
+
+_MISSING = object()
+# LocatedValue类型字段
+_CASE_LOC_FIELDS = (
+    'building_area', 'transaction_price', 'rental_price',
+    'transaction_correction', 'market_correction', 'location_correction',
+    'physical_correction', 'rights_correction', 'adjusted_price',
+    'structure_factor', 'floor_factor', 'orientation_factor',
+    'age_factor', 'physical_composite', 'composite_result',
+    'vs_result', 'decoration_price', 'attachment_price',
+    'final_price', 'east_to_west_factor',
+)
+# 字符串字段
+_CASE_STR_FIELDS = (
+    'transaction_date', 'data_source', 'location', 'usage',
+    'district', 'street', 'structure', 'orientation', 'decoration', 'east_to_west',
+)
+# P 系数字段（标准房）
+_CASE_P_FIELDS = ('p1_transaction', 'p2_date', 'p3_physical', 'p4_location')
+# 数字形式的楼层字段
+_CASE_INT_FIELDS = ('build_year', 'total_floor', 'current_floor')
+_FACTOR_FIELDS = ('location_factors', 'physical_factors', 'rights_factors')
+
+# 估价对象字段
+_SUBJECT_LOC_FIELDS = ('unit_price', 'total_price')
+_SUBJECT_VALUE_FIELDS = (
+    'structure', 'floor', 'usage', 'cert_no', 'owner', 'location_code',
+    # 涉执和租金报告
+    'district', 'street', 'orientation', 'decoration',
+    'land_end_date', 'value_date', 'appraisal_purpose', 'land_type',
+    'build_year', 'total_floor', 'current_floor',
+)
+# 最终结果字段 (字段名, 是否 LocatedValue)
+_RESULT_FIELDS = (
+    ('final_unit_price', True), ('final_total_price', True),
+    ('floor_factor', False), ('price_unit', False), ('final_price', True),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _case_field_plan(cls) -> tuple:
+    """
+    按案例类缓存字段表：只保留该类声明过的字段，省去逐个 hasattr 探测
+
+    不是 dataclass 时无法静态确定字段，保留全部字段（取值时仍按缺省值兜底）
+    """
+    if dataclasses.is_dataclass(cls):
+        names = {f.name for f in dataclasses.fields(cls)} | set(dir(cls))
+    else:
+        names = None
+
+    def keep(group):
+        return group if names is None else tuple(n for n in group if n in names)
+
+    return (keep(_CASE_LOC_FIELDS), keep(_CASE_STR_FIELDS), keep(_CASE_P_FIELDS),
+            names is None or 'floor' in names, keep(_CASE_INT_FIELDS), keep(_FACTOR_FIELDS))
+
+
+def _loc_val_to_dict(lv):
+    """转换带位置的值"""
+    if lv is None:
+        return {'value': None, 'position': {}, 'raw_text': ''}
+    pos = lv.position
+    return {
+        'value': lv.value,
+        'position': {'table_index': pos.table_index, 'row_index': pos.row_index, 'col_index': pos.col_index},
+        'raw_text': lv.raw_text,
+    }
 
 
-def result_to_dict(result) -> Dict:
-    """将提取结果转为字典（修复版）"""
+def _factor_to_dict(f):
+    """转换因素数据"""
+    raw_index = f.index if hasattr(f, 'index') else None
+    normalized_index = None
+    if raw_index is not None:
+        if isinstance(raw_index, (int, float)):
+            # 如果 > 10，认为是百分比形式，需要除以 100
+            normalized_index = raw_index / 100 if raw_index > 10 else raw_index
+        elif isinstance(raw_index, str):
+            normalized_index = parse_ratio_to_float(raw_index)
+
+    return {
+        'name': f.name,
+        'description': getattr(f, 'description', ''),
+        'level': getattr(f, 'level', ''),
+        'index': raw_index,
+        'index_normalized': normalized_index,
+        'index_raw_text': getattr(f, 'index_raw_text', ''),
+    }
 
-    def loc_val_to_dict(lv):
-        """转换带位置的值"""
-        if lv is None:
-            return {'value': None, 'position': {}, 'raw_text': ''}
-        return {
-            'value': lv.value,
-            'position': {
-                'table_index': lv.position.table_index,
-                'row_index': lv.position.row_index,
-                'col_index': lv.position.col_index,
-            },
-            'raw_text': lv.raw_text
-        }
 
-    def factor_to_dict(f):
-        """转换因素数据"""
-        raw_index = f.index if hasattr(f, 'index') else None
-        normalized_index = None
-        if raw_index is not None:
-            if isinstance(raw_index, (int, float)):
-                # 如果 > 10，认为是百分比形式，需要除以 100
-                normalized_index = raw_index / 100 if raw_index > 10 else raw_index
-            elif isinstance(raw_index, str):
-                normalized_index = parse_ratio_to_float(raw_index)
+def _case_to_dict(case):
+    """转换可比实例（修复版）"""
+    data = {
+        'case_id': case.case_id,
+        'address': _loc_val_to_dict(case.address),
+    }
 
-        return {
-            'name': f.name,
-            'description': getattr(f, 'description', ''),
-            'level': getattr(f, 'level', ''),
-            'index': raw_index,
-            'index_normalized': normalized_index,
-            'index_raw_text': getattr(f, 'index_raw_text', ''),
-        }
+    loc_fields, str_fields, p_fields, has_floor, int_fields, factor_fields = _case_field_plan(type(case))
+
+    # LocatedValue类型字段
+    for field in loc_fields:
+        val = getattr(case, field, _MISSING)
+        if hasattr(val, 'value'):
+            data[field] = _loc_val_to_dict(val)
+
+    # 字符串字段
+    for field in str_fields:
+        val = getattr(case, field, _MISSING)
+        if val and val is not _MISSING:  # 只存非空值
+            data[field] = val
+
+    # ========== P 系数字段（标准房特有）【优化重点】==========
+    for field in p_fields:
+        raw_val = getattr(case, field, _MISSING)
+        if raw_val and raw_val is not _MISSING:
+            # 【优化】同时保存原始值和计算值
+            data[field] = {
+                'raw': raw_val,  # 原始文本（'不修正', '108/103'）
+                'value': parse_ratio_to_float(raw_val),  # 计算后的浮点值
+                'display': format_p_value_display(raw_val),  # 展示用文本
+            }
+    # ========== 楼层字段（支持复式）【优化重点】==========
+    floor = getattr(case, 'floor', None) if has_floor else None
+    if floor:
+        data['floor_info'] = parse_floor_string(floor)
+        data['floor'] = floor  # 保留原始值
+
+    # 数字形式的楼层字段
+    for field in int_fields:
+        val = getattr(case, field, _MISSING)
+        if val and val is not _MISSING:
+            # 【优化】支持字符串格式
+            if isinstance(val, str):
+                # 尝试解析楼层
+                if field in ['total_floor', 'current_floor']:
+                    parsed = parse_floor_string(val)
+                    if field == 'current_floor':
+                        data[field] = parsed.get('current')
+                        if parsed.get('is_duplex'):
+                            data['floor_info'] = parsed
+                    elif field == 'total_floor':
+                        data[field] = parsed.get('total')
+                else:
+                    try:
+                        data[field] = int(val)
+                    except ValueError:
+                        data[field] = val
+            else:
+                data[field] = val
 
-    def case_to_dict(case):
-        """转换可比实例（修复版）"""
-        data = {
-            'case_id': case.case_id,
-            'address': loc_val_to_dict(case.address),
-        }
+    # 因素数据
+    for factor_type in factor_fields:
+        factors = getattr(case, factor_type, None)
+        if factors:
+            data[factor_type] = {k: _factor_to_dict(v) for k, v in factors.items()}
 
-        # LocatedValue类型字段
-        located_value_fields = [
-            'building_area', 'transaction_price', 'rental_price',
-            'transaction_correction', 'market_correction', 'location_correction',
-            'physical_correction', 'rights_correction', 'adjusted_price',
-            'structure_factor', 'floor_factor', 'orientation_factor',
-            'age_factor', 'physical_composite', 'composite_result',
-            'vs_result', 'decoration_price', 'attachment_price',
-            'final_price', 'east_to_west_factor',
-        ]
-        for field in located_value_fields:
-            if hasattr(case, field):
-                val = getattr(case, field)
-                if hasattr(val, 'value'):
-                    data[field] = loc_val_to_dict(val)
-
-        # 字符串字段 - 【修复】添加缺失的字段
-        string_fields = [
-            'transaction_date', 'data_source', 'location', 'usage',
-            'district', 'street', 'structure', 'orientation', 'decoration', 'east_to_west'
-        ]
-        for field in string_fields:
-            if hasattr(case, field):
-                val = getattr(case, field)
-                if val:  # 只存非空值
-                    data[field] = val
-
-        # ========== P 系数字段（标准房特有）【优化重点】==========
-        p_fields = ['p1_transaction', 'p2_date', 'p3_physical', 'p4_location']
-        for field in p_fields:
-            if hasattr(case, field):
-                raw_val = getattr(case, field)
-                if raw_val:
-                    # 【优化】同时保存原始值和计算值
-                    data[field] = {
-                        'raw': raw_val,  # 原始文本（'不修正', '108/103'）
-                        'value': parse_ratio_to_float(raw_val),  # 计算后的浮点值
-                        'display': format_p_value_display(raw_val),  # 展示用文本
-                    }
-        # ========== 楼层字段（支持复式）【优化重点】==========
-        if hasattr(case, 'floor') and case.floor:
-            data['floor_info'] = parse_floor_string(case.floor)
-            data['floor'] = case.floor  # 保留原始值
-
-        # 数字形式的楼层字段
-        int_fields = ['build_year', 'total_floor', 'current_floor']
-        for field in int_fields:
-            if hasattr(case, field):
-                val = getattr(case, field)
-                if val:
-                    # 【优化】支持字符串格式
-                    if isinstance(val, str):
-                        # 尝试解析楼层
-                        if field in ['total_floor', 'current_floor']:
-                            parsed = parse_floor_string(val)
-                            if field == 'current_floor':
-                                data[field] = parsed.get('current')
-                                if parsed.get('is_duplex'):
-                                    data['floor_info'] = parsed
-                            elif field == 'total_floor':
-                                data[field] = parsed.get('total')
-                        else:
-                            try:
-                                data[field] = int(val)
-                            except ValueError:
-                                data[field] = val
-                    else:
-                        data[field] = val
+    return data
 
-        # 【修复】数字字段 - 新增
-        # int_fields = ['build_year', 'total_floor', 'current_floor']
-        # for field in int_fields:
-        #     if hasattr(case, field):
-        #         val = getattr(case, field)
-        #         if val:  # 只存非零值
-        #             data[field] = val
-
-        # 因素数据
-        for factor_type in ['location_factors', 'physical_factors', 'rights_factors']:
-            if hasattr(case, factor_type):
-                factors = getattr(case, factor_type)
-                if factors:
-                    data[factor_type] = {k: factor_to_dict(v) for k, v in factors.items()}
 
-        return data
+def _batch_subject_to_dict(subj):
+    """批量评估的估价对象转换"""
+    return {
+        'seq_no': subj.seq_no,
+        'address': subj.address,
+        'building_area': subj.building_area,
+        'total_price': subj.total_price,
+        'unit_price': subj.unit_price,
+        'floor_factor': subj.floor_factor,
+        'current_floor': getattr(subj, 'current_floor', 0),
+        'total_floor': getattr(subj, 'total_floor', 0),
+    }
 
-    def batch_subject_to_dict(subj):
-        """批量评估的估价对象转换"""
-        return {
-            'seq_no': subj.seq_no,
-            'address': subj.address,
-            'building_area': subj.building_area,
-            'total_price': subj.total_price,
-            'unit_price': subj.unit_price,
-            'floor_factor': subj.floor_factor,
-            'current_floor': getattr(subj, 'current_floor', 0),
-            'total_floor': getattr(subj, 'total_floor', 0),
-        }
 
+def result_to_dict(result) -> Dict:
+    """将提取结果转为字典（修复版）"""
     # 检查是否是批量评估报告（XianzhibExtractionResult）
     if hasattr(result, 'subjects') and isinstance(result.subjects, list):
         # 批量评估报告
@@ -169,8 +257,8 @@ def result_to_dict(result) -> Dict:
             'total_area': result.total_area,
             'total_value': result.total_value,
             'base_price': getattr(result, 'base_price', 0),
-            'subjects': [batch_subject_to_dict(s) for s in result.subjects],
-            'case_groups': [[case_to_dict(c) for c in group] for group in result.case_groups],
+            'subjects': [_batch_subject_to_dict(s) for s in result.subjects],
+            'case_groups': [[_case_to_dict(c) for c in group] for group in result.case_groups],
         }
         return data
 
@@ -179,66 +267,61 @@ def result_to_dict(result) -> Dict:
         'source_file': result.source_file,
         'is_batch': False,
         'subject': {
-            'address': loc_val_to_dict(result.subject.address),
-            'building_area': loc_val_to_dict(result.subject.building_area),
+            'address': _loc_val_to_dict(result.subject.address),
+            'building_area': _loc_val_to_dict(result.subject.building_area),
         },
-        'cases': [case_to_dict(c) for c in result.cases],
+        'cases': [_case_to_dict(c) for c in result.cases],
     }
 
     # ========== 估价对象字段 ==========
     subject = result.subject
 
+    subject_data = data['subject']
+
     # LocatedValue类型
-    for field in ['unit_price', 'total_price']:
-        if hasattr(subject, field):
-            val = getattr(subject, field)
-            if hasattr(val, 'value') and val.value is not None:
-                data['subject'][field] = loc_val_to_dict(val)
-
-    # 原有字符串字段
-    for field in ['structure', 'floor', 'usage', 'cert_no', 'owner', 'location_code']:
-        if hasattr(subject, field):
-            val = getattr(subject, field)
-            if val:
-                data['subject'][field] = val
-
-    # 【修复】新增字符串字段（涉执和租金报告）
-    for field in ['district', 'street', 'orientation', 'decoration',
-                  'land_end_date', 'value_date', 'appraisal_purpose', 'land_type']:
-        if hasattr(subject, field):
-            val = getattr(subject, field)
-            if val:
-                data['subject'][field] = val
-
-    # 【修复】新增数字字段（涉执和租金报告）
-    for field in ['build_year', 'total_floor', 'current_floor']:
-        if hasattr(subject, field):
-            val = getattr(subject, field)
-            if val:  # 非零值
-                data['subject'][field] = val
-
-    # 【修复】新增因素数据（涉执和租金报告的Subject）
-    for factor_type in ['location_factors', 'physical_factors', 'rights_factors']:
-        if hasattr(subject, factor_type):
-            factors = getattr(subject, factor_type)
-            if factors:
-                data['subject'][factor_type] = {k: factor_to_dict(v) for k, v in factors.items()}
+    for field in _SUBJECT_LOC_FIELDS:
+        val = getattr(subject, field, None)
+        if hasattr(val, 'value') and val.value is not None:
+            subject_data[field] = _loc_val_to_dict(val)
+
+    # 字符串字段 / 数字字段（只存非空、非零值）
+    for field in _SUBJECT_VALUE_FIELDS:
+        val = getattr(subject, field, None)
+        if val:
+            subject_data[field] = val
+
+    # 因素数据（涉执和租金报告的Subject）
+    for factor_type in _FACTOR_FIELDS:
+        factors = getattr(subject, factor_type, None)
+        if factors:
+            subject_data[factor_type] = {k: _factor_to_dict(v) for k, v in factors.items()}
 
     # ========== 最终结果 ==========
-    if hasattr(result, 'final_unit_price'):
-        data['final_unit_price'] = loc_val_to_dict(result.final_unit_price)
-    if hasattr(result, 'final_total_price'):
-        data['final_total_price'] = loc_val_to_dict(result.final_total_price)
-    if hasattr(result, 'floor_factor'):
-        data['floor_factor'] = result.floor_factor
-    if hasattr(result, 'price_unit'):
-        data['price_unit'] = result.price_unit
-    if hasattr(result, 'final_price'):
-        data['final_price'] = loc_val_to_dict(result.final_price)
+    for field, is_loc_val in _RESULT_FIELDS:
+        val = getattr(result, field, _MISSING)
+        if val is not _MISSING:
+            data[field] = _loc_val_to_dict(val) if is_loc_val else val
 
     return data
 
 
+# get_case 返回的字段（与 cases 表列同名，顺序即 SELECT 顺序）
+_CASE_DETAIL_COLUMNS = (
+    'case_id', 'doc_id', 'report_type', 'address', 'district', 'street', 'area',
+    'price', 'usage', 'build_year', 'total_floor', 'current_floor', 'orientation',
+    'decoration', 'structure', 'case_data', 'create_time',
+)
+_CASE_DETAIL_SQL_COLUMNS = ', '.join(_CASE_DETAIL_COLUMNS)
+
+
+def _case_detail_to_dict(row) -> Dict:
+    """cases 表一行（_CASE_DETAIL_COLUMNS 顺序）转为案例详情字典"""
+    case = dict(zip(_CASE_DETAIL_COLUMNS, row))
+    create_time = case['create_time']
+    case['create_time'] = create_time.isoformat() if create_time else None
+    return case
+
+
 class KnowledgeBaseManager:
     """知识库管理器（数据库版）"""
 
@@ -248,6 +331,9 @@ class KnowledgeBaseManager:
 
         # 向量存储（延迟初始化）
         self._vector_store = None
+        # 尚未同步到向量索引的新增 / 删除案例
+        self._pending_vector_adds = set()
+        self._pending_vector_deletes = set()
 
         # 测试数据库连接
         if not test_pg_connection():
@@ -273,34 +359,80 @@ class KnowledgeBaseManager:
                 return None
         return self._vector_store
 
-    def rebuild_vector_index(self):
-        """重建向量索引"""
-        if not self.enable_vector or self.vector_store is None:
+    def rebuild_vector_index(self, force: bool = False):
+        """
+        重建向量索引
+
+        Args:
+            force: 向量存储尚未加载时是否加载它；默认不加载，避免入库路径引入模型依赖
+        """
+        if not self.enable_vector:
+            print("⚠️ 向量存储未启用")
+            return
+        if self._vector_store is None and not force:
+            return
+        if self.vector_store is None:
             print("⚠️ 向量存储未启用")
             return
 
-        # 加载所有案例
-        cases = []
-        for case_item in self.list_cases():
-            case_data = self.get_case(case_item['case_id'])
-            if case_data:
-                cases.append(case_data)
+        # 全量重建覆盖所有待同步的变更；失败时标记为脏，下次 ensure_vector_index 再整体重建
+        self._pending_vector_adds = set()
+        self._pending_vector_deletes = set()
+        try:
+            # 加载所有案例（一次查询）
+            cases = list(self._iter_all_case_rows())
 
-        # 重建索引
-        self.vector_store.rebuild(cases)
+            # 重建索引
+            self.vector_store.rebuild(cases)
+        except Exception:
+            self.vector_store.mark_dirty()
+            raise
 
-    def ensure_vector_index(self):
-        """确保向量索引是最新的"""
-        if not self.enable_vector or self.vector_store is None:
+    def ensure_vector_index(self, force: bool = False):
+        """
+        确保向量索引是最新的
+
+        只同步上次以来新增/删除的案例；待同步数超过总数的 _VECTOR_REBUILD_RATIO 时整体重建
+        """
+        if not self.enable_vector or (self._vector_store is None and not force):
+            return
+        if self.vector_store is None:
             return
 
         if self.vector_store.is_dirty:
             self.rebuild_vector_index()
+            return
+
+        adds = self._pending_vector_adds
+        deletes = self._pending_vector_deletes
+        if not adds and not deletes:
+            return
+
+        with pg_cursor(commit=False) as cursor:
+            cursor.execute("SELECT COUNT(*) FROM cases")
+            total = cursor.fetchone()[0]
+        if len(adds) + len(deletes) > _VECTOR_REBUILD_RATIO * max(total, 1):
+            self.rebuild_vector_index()
+            return
+
+        # 同步期间的新变更记入新集合；同步失败时这批变更已无法单独重放，标记为脏改为整体重建
+        self._pending_vector_adds = set()
+        self._pending_vector_deletes = set()
+        try:
+            if deletes:
+                self.vector_store.delete(list(deletes))
+            if adds:
+                self.vector_store.add_batch(list(self._iter_all_case_rows(list(adds))))
+        except Exception:
+            self.vector_store.mark_dirty()
+            raise
 
     def add_report(self, result, report_type: str) -> str:
         """
         添加报告到知识库（支持普通报告和批量评估报告）
 
+        文档和全部案例在同一个事务里写入，案例用 execute_values 批量插入
+
         Args:
             result: 提取结果
             report_type: 报告类型
@@ -308,38 +440,46 @@ class KnowledgeBaseManager:
         Returns:
             doc_id
         """
+        from psycopg2.extras import execute_values
+
         doc_id = generate_id("doc")
         data = result_to_dict(result)
 
-        # 检查是否是批量评估报告
-        is_batch = hasattr(result, 'subjects') and isinstance(result.subjects, list)
+        # 是否是批量评估报告（result_to_dict 已判断过）
+        is_batch = data['is_batch']
+
+        # 案例行，顺序与 _CASE_INSERT_COLUMNS 一致
+        case_rows = []
 
         if is_batch:
             # ==================== 批量评估报告 ====================
             first_subject = result.subjects[0] if result.subjects else None
             address = first_subject.address if first_subject else ''
             area = result.total_area
-            case_count = sum(len(group) for group in result.case_groups)
-
-            # 插入文档
-            with pg_cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO documents (doc_id, filename, file_path, file_type, report_type, 
-                                           address, area, case_count, metadata)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    doc_id,
-                    result.source_file,
-                    None,
-                    'word',
-                    report_type,
-                    f"{address} 等{result.total_count}套",  # 批量评估显示总数
-                    area,
-                    case_count,
-                    json.dumps(data, ensure_ascii=False),
-                ))
-
-            # 插入批量估价对象为案例（便于检索）
+            case_count = sum(map(len, result.case_groups))
+
+            # 每个案例只序列化一次：文档 metadata 直接嵌入这些片段
+            group_json = [[_json_dumps(c) for c in group] for group in data['case_groups']]
+            if HAS_ORJSON_FRAGMENT:
+                metadata = _json_dumps({**data, 'case_groups': [
+                    [_json_fragment(c) for c in group] for group in group_json
+                ]})
+            else:
+                metadata = _json_dumps(data)
+
+            document_row = (
+                doc_id,
+                result.source_file,
+                None,
+                'word',
+                report_type,
+                f"{address} 等{result.total_count}套",  # 批量评估显示总数
+                area,
+                case_count,
+                metadata,
+            )
+
+            # 批量估价对象作为案例（便于检索）
             for subj in result.subjects:
                 case_id = f"{doc_id}_subj_{subj.seq_no}"
                 case_data = {
@@ -352,126 +492,38 @@ class KnowledgeBaseManager:
                     'is_subject': True,  # 标记为估价对象
                 }
 
-                with pg_cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO cases (case_id, case_id_full, doc_id, report_type, address,
-                                           district, street, area, price, usage, build_year,
-                                           total_floor, current_floor, orientation, decoration,
-                                           structure, case_data)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        case_id,
-                        case_id,
-                        doc_id,
-                        report_type,
-                        subj.address,
-                        '',  # district
-                        '',  # street
-                        subj.building_area,
-                        subj.unit_price,  # 使用单价
-                        '',  # usage
-                        0,   # build_year
-                        subj.total_floor,
-                        subj.current_floor,
-                        '',  # orientation
-                        '',  # decoration
-                        '',  # structure
-                        json.dumps(case_data, ensure_ascii=False),
-                    ))
-
-            # 插入可比实例组中的案例
-            for group_idx, case_group in enumerate(result.case_groups):
-                for case in case_group:
-                    case_id = f"{doc_id}_g{group_idx}_case_{case.case_id}"
-                    case_dict = data['case_groups'][group_idx][case_group.index(case)]
-                    case_dict['case_id_full'] = case_id
-                    case_dict['from_doc'] = doc_id
-                    case_dict['report_type'] = report_type
-                    case_dict['group_index'] = group_idx
-
-                    price = 0
-                    if hasattr(case, 'transaction_price') and case.transaction_price.value:
-                        price = case.transaction_price.value
-
-                    area = case.building_area.value if case.building_area.value else 0
-
-                    with pg_cursor() as cursor:
-                        cursor.execute("""
-                            INSERT INTO cases (case_id, case_id_full, doc_id, report_type, address,
-                                               district, street, area, price, usage, build_year,
-                                               total_floor, current_floor, orientation, decoration,
-                                               structure, case_data)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (
-                            case_id,
-                            case_id,
-                            doc_id,
-                            report_type,
-                            case.address.value or '',
-                            getattr(case, 'district', ''),
-                            getattr(case, 'street', ''),
-                            area,
-                            price,
-                            getattr(case, 'usage', ''),
-                            getattr(case, 'build_year', 0),
-                            getattr(case, 'total_floor', 0),
-                            getattr(case, 'current_floor', 0),
-                            getattr(case, 'orientation', ''),
-                            getattr(case, 'decoration', ''),
-                            getattr(case, 'structure', ''),
-                            json.dumps(case_dict, ensure_ascii=False),
-                        ))
-
-        else:
-            # ==================== 普通报告 ====================
-            subject = result.subject
-
-            # 插入文档
-            with pg_cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO documents (doc_id, filename, file_path, file_type, report_type, 
-                                           address, area, case_count, metadata)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
+                case_rows.append((
+                    case_id,
+                    case_id,
                     doc_id,
-                    result.source_file,
-                    None,
-                    'word',
                     report_type,
-                    subject.address.value or '',
-                    subject.building_area.value or 0,
-                    len(result.cases),
-                    json.dumps(data, ensure_ascii=False),
+                    subj.address,
+                    '',  # district
+                    '',  # street
+                    subj.building_area,
+                    subj.unit_price,  # 使用单价
+                    '',  # usage
+                    0,   # build_year
+                    subj.total_floor,
+                    subj.current_floor,
+                    '',  # orientation
+                    '',  # decoration
+                    '',  # structure
+                    _json_dumps(case_data),
                 ))
 
-            # 插入案例
-            for case in result.cases:
-                case_id = f"{doc_id}_case_{case.case_id}"
-                case_data = data['cases'][result.cases.index(case)]
-                case_data['case_id_full'] = case_id
-                case_data['from_doc'] = doc_id
-                case_data['report_type'] = report_type
-
-                # 获取价格
-                price = 0
-                if hasattr(case, 'transaction_price') and case.transaction_price.value:
-                    price = case.transaction_price.value
-                elif hasattr(case, 'rental_price') and case.rental_price.value:
-                    price = case.rental_price.value
-                elif hasattr(case, 'final_price') and case.final_price.value:
-                    price = case.final_price.value
-
-                # 获取面积
-                area = case.building_area.value if case.building_area.value else 0
-
-                with pg_cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO cases (case_id, case_id_full, doc_id, report_type, address,
-                                           district, street, area, price, usage, build_year,
-                                           total_floor, current_floor, orientation, decoration,
-                                           structure, case_data)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
+            # 可比实例组中的案例
+            for group_idx, (case_group, case_group_json) in enumerate(zip(result.case_groups, group_json)):
+                for case, case_json in zip(case_group, case_group_json):
+                    case_id = f"{doc_id}_g{group_idx}_case_{case.case_id}"
+                    case_json = _json_extend(case_json, {
+                        'case_id_full': case_id,
+                        'from_doc': doc_id,
+                        'report_type': report_type,
+                        'group_index': group_idx,
+                    })
+
+                    case_rows.append((
                         case_id,
                         case_id,
                         doc_id,
@@ -479,35 +531,100 @@ class KnowledgeBaseManager:
                         case.address.value or '',
                         getattr(case, 'district', ''),
                         getattr(case, 'street', ''),
-                        area,
-                        price,
+                        case.building_area.value or 0,
+                        _case_price(case, _GROUP_CASE_PRICE_FIELDS),
                         getattr(case, 'usage', ''),
                         getattr(case, 'build_year', 0),
                         getattr(case, 'total_floor', 0),
-                        getattr(case, 'current_floor', 0) if getattr(case, 'current_floor', 0) != "" else 0,
+                        getattr(case, 'current_floor', 0),
                         getattr(case, 'orientation', ''),
                         getattr(case, 'decoration', ''),
                         getattr(case, 'structure', ''),
-                        json.dumps(case_data, ensure_ascii=False),
+                        case_json,
                     ))
 
-        # 添加到向量索引
+        else:
+            # ==================== 普通报告 ====================
+            subject = result.subject
+
+            # 每个案例只序列化一次：文档 metadata 直接嵌入这些片段
+            cases_json = [_json_dumps(c) for c in data['cases']]
+            if HAS_ORJSON_FRAGMENT:
+                metadata = _json_dumps({**data, 'cases': [_json_fragment(c) for c in cases_json]})
+            else:
+                metadata = _json_dumps(data)
+
+            document_row = (
+                doc_id,
+                result.source_file,
+                None,
+                'word',
+                report_type,
+                subject.address.value or '',
+                subject.building_area.value or 0,
+                len(result.cases),
+                metadata,
+            )
+
+            for case, case_json in zip(result.cases, cases_json):
+                case_id = f"{doc_id}_case_{case.case_id}"
+                case_json = _json_extend(case_json, {
+                    'case_id_full': case_id,
+                    'from_doc': doc_id,
+                    'report_type': report_type,
+                })
+
+                current_floor = getattr(case, 'current_floor', 0)
+
+                case_rows.append((
+                    case_id,
+                    case_id,
+                    doc_id,
+                    report_type,
+                    case.address.value or '',
+                    getattr(case, 'district', ''),
+                    getattr(case, 'street', ''),
+                    case.building_area.value or 0,
+                    _case_price(case, _CASE_PRICE_FIELDS),
+                    getattr(case, 'usage', ''),
+                    getattr(case, 'build_year', 0),
+                    getattr(case, 'total_floor', 0),
+                    current_floor if current_floor != "" else 0,
+                    getattr(case, 'orientation', ''),
+                    getattr(case, 'decoration', ''),
+                    getattr(case, 'structure', ''),
+                    case_json,
+                ))
+
+        # 文档 + 案例一个事务写入
+        with pg_cursor() as cursor:
+            execute_prepared(cursor, 'kb_insert_document', """
+                INSERT INTO documents (doc_id, filename, file_path, file_type, report_type, 
+                                       address, area, case_count, metadata)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, document_row)
+            if case_rows:
+                execute_values(
+                    cursor,
+                    f"INSERT INTO cases ({', '.join(_CASE_INSERT_COLUMNS)}) VALUES %s",
+                    case_rows,
+                    page_size=_CASE_INSERT_PAGE_SIZE,
+                )
+
+        # 记录待同步到向量索引的案例，由 ensure_vector_index 增量写入
         if self.enable_vector and self._vector_store is not None:
-            self._vector_store.mark_dirty()
+            self._pending_vector_adds.update(row[0] for row in case_rows)
 
         return doc_id
 
     def get_report(self, doc_id: str) -> Optional[Dict]:
         """获取报告"""
         with pg_cursor(commit=False) as cursor:
-            cursor.execute("""
+            execute_prepared(cursor, 'kb_get_report', """
                 SELECT report_type, address, area, metadata, create_time FROM documents WHERE doc_id = %s
             """, (doc_id,))
             row = cursor.fetchone()
             if row:
-                data = row
-                if isinstance(data, str):
-                    return json.loads(data)
                 return {
                     'report_type': row[0],
                     'address': row[1],
@@ -517,119 +634,159 @@ class KnowledgeBaseManager:
                 }
         return None
 
+    def get_report_header(self, doc_id: str) -> Optional[Dict]:
+        """获取报告头信息（与 list_reports 的行相同），不读取 metadata 大字段"""
+        with pg_cursor(commit=False) as cursor:
+            execute_prepared(cursor, 'kb_get_report_header', """
+                SELECT filename, report_type, address, area, case_count, create_time FROM documents WHERE doc_id = %s
+            """, (doc_id,))
+            row = cursor.fetchone()
+            if row:
+                return {
+                    'doc_id': doc_id,
+                    'source_file': row[0],
+                    'report_type': row[1],
+                    'address': row[2],
+                    'area': row[3],
+                    'case_count': row[4],
+                    'create_time': row[5],
+                }
+        return None
+
     def get_case(self, case_id: str) -> Optional[Dict]:
         """获取单个案例详情"""
         with pg_cursor(commit=False) as cursor:
-            cursor.execute("""
-                           SELECT case_id,
-                                  doc_id,
-                                  report_type,
-                                  address,
-                                  district,
-                                  street,
-                                  area,
-                                  price, usage, build_year, total_floor, current_floor, orientation, decoration, structure, case_data, create_time
-                           FROM cases
-                           WHERE case_id = %s
-                           """, (case_id,))
-
+            execute_prepared(cursor, 'kb_get_case',
+                             f"SELECT {_CASE_DETAIL_SQL_COLUMNS} FROM cases WHERE case_id = %s", (case_id,))
             row = cursor.fetchone()
             if not row:
                 return None
+            return _case_detail_to_dict(row)
 
-            return {
-                "case_id": row[0],
-                "doc_id": row[1],
-                "report_type": row[2],
-                "address": row[3],
-                "district": row[4],
-                "street": row[5],
-                "area": row[6],
-                "price": row[7],
-                "usage": row[8],
-                "build_year": row[9],
-                "total_floor": row[10],
-                "current_floor": row[11],
-                "orientation": row[12],
-                "decoration": row[13],
-                "structure": row[14],
-                "case_data": row[15],
-                "create_time": row[16].isoformat() if row[16] else None,
-            }
+    def get_cases(self, case_ids: List[str]) -> List[Dict]:
+        """批量获取案例详情（一次查询），按 case_ids 顺序返回，不存在的跳过"""
+        if not case_ids:
+            return []
+        with pg_cursor(commit=False) as cursor:
+            cursor.execute(f"SELECT {_CASE_DETAIL_SQL_COLUMNS} FROM cases WHERE case_id = ANY(%s)",
+                           (list(case_ids),))
+            by_id = {row[0]: _case_detail_to_dict(row) for row in cursor}
+        return [by_id[case_id] for case_id in case_ids if case_id in by_id]
+
+    def _iter_all_case_rows(self, case_ids: List[str] = None) -> Iterator[Dict]:
+        """
+        一次查询流式产出案例详情（与 get_case 返回结构相同）
+
+        Args:
+            case_ids: 只取这些案例；默认全部
+        """
+        sql = f"SELECT {_CASE_DETAIL_SQL_COLUMNS} FROM cases"
+        params = ()
+        if case_ids is not None:
+            sql += " WHERE case_id = ANY(%s)"
+            params = (case_ids,)
+
+        with pg_cursor(commit=False, name='kb_iter_case_details') as cursor:
+            cursor.execute(sql + " ORDER BY create_time DESC", params)
+            for row in cursor:
+                yield _case_detail_to_dict(row)
 
     def list_reports(self, report_type: str = None) -> List[Dict]:
         """列出报告"""
-        with pg_cursor(commit=False) as cursor:
-            if report_type:
-                cursor.execute("""
-                    SELECT doc_id, filename, report_type, address, area, case_count, create_time
-                    FROM documents WHERE report_type = %s
-                    ORDER BY create_time DESC
-                """, (report_type,))
-            else:
-                cursor.execute("""
-                    SELECT doc_id, filename, report_type, address, area, case_count, create_time
-                    FROM documents ORDER BY create_time DESC
-                """)
+        return list(self.iter_reports(report_type))
 
-            columns = ['doc_id', 'source_file', 'report_type', 'address', 'area', 'case_count', 'create_time']
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    def iter_reports(self, report_type: str = None) -> Iterator[Dict]:
+        """逐行产出报告（服务端游标分批取回，结果集不整体载入内存）"""
+        sql = "SELECT doc_id, filename, report_type, address, area, case_count, create_time FROM documents"
+        params = ()
+        if report_type:
+            sql += " WHERE report_type = %s"
+            params = (report_type,)
+
+        with pg_cursor(commit=False, name='kb_iter_reports') as cursor:
+            cursor.execute(sql + " ORDER BY create_time DESC", params)
+            for row in cursor:
+                yield {
+                    'doc_id': row[0],
+                    'source_file': row[1],
+                    'report_type': row[2],
+                    'address': row[3],
+                    'area': row[4],
+                    'case_count': row[5],
+                    'create_time': row[6],
+                }
 
     def list_cases(self, report_type: str = None) -> List[Dict]:
         """列出案例"""
-        with pg_cursor(commit=False) as cursor:
-            if report_type:
-                cursor.execute("""
-                    SELECT case_id, doc_id, report_type, address, area, price, district, usage
-                    FROM cases WHERE report_type = %s
-                    ORDER BY create_time DESC
-                """, (report_type,))
-            else:
-                cursor.execute("""
-                    SELECT case_id, doc_id, report_type, address, area, price, district, usage
-                    FROM cases ORDER BY create_time DESC
-                """)
+        return list(self.iter_cases(report_type))
 
-            columns = ['case_id', 'from_doc', 'report_type', 'address', 'area', 'price', 'district', 'usage']
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    def iter_cases(self, report_type: str = None) -> Iterator[Dict]:
+        """逐行产出案例（服务端游标分批取回，结果集不整体载入内存）"""
+        sql = "SELECT case_id, doc_id, report_type, address, area, price, district, usage FROM cases"
+        params = ()
+        if report_type:
+            sql += " WHERE report_type = %s"
+            params = (report_type,)
+
+        with pg_cursor(commit=False, name='kb_iter_cases') as cursor:
+            cursor.execute(sql + " ORDER BY create_time DESC", params)
+            for row in cursor:
+                yield {
+                    'case_id': row[0],
+                    'from_doc': row[1],
+                    'report_type': row[2],
+                    'address': row[3],
+                    'area': row[4],
+                    'price': row[5],
+                    'district': row[6],
+                    'usage': row[7],
+                }
 
     def delete_report(self, doc_id: str) -> bool:
         """删除报告及其案例"""
+        track_vectors = self.enable_vector and self._vector_store is not None
         with pg_cursor() as cursor:
-            # 级联删除会自动删除关联的案例
+            # 向量索引已加载时先删案例以取回 case_id，其余由级联删除
+            if track_vectors:
+                cursor.execute("DELETE FROM cases WHERE doc_id = %s RETURNING case_id", (doc_id,))
+                deleted = [row[0] for row in cursor.fetchall()]
             cursor.execute("DELETE FROM documents WHERE doc_id = %s", (doc_id,))
 
-        # 标记向量索引需要重建
-        if self.enable_vector and self._vector_store is not None:
-            self._vector_store.mark_dirty()
+        # 记录待从向量索引删除的案例；尚未同步的新增直接撤销
+        if track_vectors:
+            for case_id in deleted:
+                if case_id in self._pending_vector_adds:
+                    self._pending_vector_adds.discard(case_id)
+                else:
+                    self._pending_vector_deletes.add(case_id)
 
         return True
 
     def stats(self) -> Dict:
         """统计信息"""
+        # 按类型的报告数和案例总数一次查询取回，报告总数由分类计数求和
         with pg_cursor(commit=False) as cursor:
-            # 报告总数
-            cursor.execute("SELECT COUNT(*) FROM documents")
-            total_reports = cursor.fetchone()[0]
-
-            # 案例总数
-            cursor.execute("SELECT COUNT(*) FROM cases")
-            total_cases = cursor.fetchone()[0]
-
-            # 按类型统计
             cursor.execute("""
-                SELECT report_type, COUNT(*) FROM documents 
+                SELECT 'report', report_type, COUNT(*) FROM documents
                 GROUP BY report_type
+                UNION ALL
+                SELECT 'case', NULL, COUNT(*) FROM cases
             """)
-            by_type = {row[0]: row[1] for row in cursor.fetchall()}
+            rows = cursor.fetchall()
 
-        # 向量索引状态
+        by_type = {}
+        total_cases = 0
+        for kind, report_type, count in rows:
+            if kind == 'case':
+                total_cases = count
+            else:
+                by_type[report_type] = count
+        total_reports = sum(by_type.values())
+
+        # 向量索引状态（只读已加载的向量存储，不触发初始化；出错不影响 enable_vector）
         vector_stats = {}
-        if self.enable_vector:
+        if self.enable_vector and self._vector_store is not None:
             try:
-                from .vector_store_milvus import MilvusVectorStore
-                if self._vector_store is None:
-                    self._vector_store = MilvusVectorStore()
                 vector_stats = self._vector_store.get_stats()
             except Exception as e:
                 vector_stats = {'error': str(e)}
@@ -648,6 +805,8 @@ class KnowledgeBaseManager:
             cursor.execute("DELETE FROM documents")
 
         # 清空向量索引
+        self._pending_vector_adds.clear()
+        self._pending_vector_deletes.clear()
         if self.enable_vector and self._vector_store is not None:
             self._vector_store.clear()
 
@@ -692,31 +851,17 @@ class KnowledgeBaseManager:
         params.append(limit)
 
         with pg_cursor(commit=False) as cursor:
+            # 列与 case_data 在库内合并为一个 jsonb（case_data 中的同名键优先），驱动一次解码
             cursor.execute(f"""
-                SELECT case_id, doc_id, report_type, address, area, price, 
-                       district, usage, case_data
-                FROM cases 
+                SELECT jsonb_build_object(
+                           'case_id', case_id, 'from_doc', doc_id, 'report_type', report_type,
+                           'address', address, 'area', area, 'price', price,
+                           'district', district, 'usage', usage
+                       ) || COALESCE(case_data, '{{}}'::jsonb)
+                FROM cases
                 WHERE {where_clause}
                 ORDER BY create_time DESC
                 LIMIT %s
             """, params)
 
-            results = []
-            for row in cursor.fetchall():
-                case_data = row[8]
-                if isinstance(case_data, str):
-                    case_data = json.loads(case_data)
-
-                results.append({
-                    'case_id': row[0],
-                    'from_doc': row[1],
-                    'report_type': row[2],
-                    'address': row[3],
-                    'area': row[4],
-                    'price': row[5],
-                    'district': row[6],
-                    'usage': row[7],
-                    **case_data,
-                })
-
-            return results
\ No newline at end of file
+            return [row[0] for row in cursor]
@@ -10,16 +10,51 @@
 import math
 import os
 import sys
-import json
+import heapq
+import hashlib
+import functools
+from operator import itemgetter
 from typing import List, Dict, Optional, Tuple
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import KB_CONFIG
+from .db_connection import pg_cursor, execute_prepared
 
 # 检测是否使用数据库模式
 USE_DATABASE = os.getenv('KB_USE_DATABASE', 'false').lower() == 'true'
 
+# 文件模式下案例数超过该值时用 numpy 批量计算相似度
+_NUMPY_SCORE_MIN_ROWS = 10000
+
+# 修正系数统计项：(统计键, 案例字段)
+_CORRECTION_FIELDS = (
+    ('transaction', 'transaction_correction'),
+    ('market', 'market_correction'),
+    ('location', 'location_correction'),
+    ('physical', 'physical_correction'),
+    ('rights', 'rights_correction'),
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _address_shingles(address: str) -> Tuple[str, ...]:
+    """地址的二字片段（去重），用于地址关键词匹配"""
+    return tuple(dict.fromkeys(address[i:i + 2] for i in range(len(address) - 1)))
+
+
+def _statement_name(prefix: str, where_clause: str) -> str:
+    """按过滤条件的组合生成预备语句名：同一组合的查询复用同一条预备语句"""
+    return f"{prefix}_{hashlib.md5(where_clause.encode('utf-8')).hexdigest()}"
+
+
+def _keyword_prefix(keyword: str) -> Optional[str]:
+    """地址关键词以 * 结尾时按前缀匹配，返回前缀；否则返回 None（按子串匹配）"""
+    prefix = keyword[:-1]
+    if keyword.endswith('*') and prefix and not any(c in prefix for c in '%_*'):
+        return prefix
+    return None
+
 
 class KnowledgeBaseQuery:
     """知识库查询器"""
@@ -55,29 +90,40 @@ class KnowledgeBaseQuery:
     def _get_cases_from_db(self, report_type: str = None) -> List[Dict]:
         """从数据库获取案例"""
         try:
-            from knowledge_base.db_connection import pg_cursor
-
-            with pg_cursor(commit=False) as cursor:
-                if report_type:
-                    cursor.execute("""
-                        SELECT case_id, doc_id, report_type, address, district, street,
-                               area, price, usage, build_year, total_floor, current_floor,
-                               orientation, decoration, structure
-                        FROM cases 
-                        WHERE report_type = %s
-                    """, (report_type,))
-                else:
-                    cursor.execute("""
-                        SELECT case_id, doc_id, report_type, address, district, street,
-                               area, price, usage, build_year, total_floor, current_floor,
-                               orientation, decoration, structure
-                        FROM cases
-                    """)
-
-                columns = ['case_id', 'from_doc', 'report_type', 'address', 'district',
-                          'street', 'area', 'price', 'usage', 'build_year', 'total_floor',
-                          'current_floor', 'orientation', 'decoration', 'structure']
-                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            sql = """
+                SELECT case_id, doc_id, report_type, address, district, street,
+                       area, price, usage, build_year, total_floor, current_floor,
+                       orientation, decoration, structure
+                FROM cases
+            """
+            params = ()
+            if report_type:
+                sql += " WHERE report_type = %s"
+                params = (report_type,)
+
+            # 服务端游标分批取回，逐行直接构造字典
+            with pg_cursor(commit=False, name='kb_query_cases') as cursor:
+                cursor.execute(sql, params)
+                return [
+                    {
+                        'case_id': row[0],
+                        'from_doc': row[1],
+                        'report_type': row[2],
+                        'address': row[3],
+                        'district': row[4],
+                        'street': row[5],
+                        'area': row[6],
+                        'price': row[7],
+                        'usage': row[8],
+                        'build_year': row[9],
+                        'total_floor': row[10],
+                        'current_floor': row[11],
+                        'orientation': row[12],
+                        'decoration': row[13],
+                        'structure': row[14],
+                    }
+                    for row in cursor
+                ]
         except Exception as e:
             print(f"⚠️ 从数据库获取案例失败: {e}")
             return []
@@ -104,7 +150,7 @@ class KnowledgeBaseQuery:
         搜索案例
 
         Args:
-            keyword: 地址关键词
+            keyword: 地址关键词（以 * 结尾时按前缀匹配）
             report_type: 报告类型
             min_price/max_price: 价格范围
             min_area/max_area: 面积范围
@@ -131,6 +177,12 @@ class KnowledgeBaseQuery:
 
         # 文件模式：内存过滤
         results = []
+        prefix = _keyword_prefix(keyword) if keyword else None
+        # 范围条件按 is not None 判断（与数据库模式一致，0 也是有效边界）
+        has_min_price, has_max_price = min_price is not None, max_price is not None
+        has_min_area, has_max_area = min_area is not None, max_area is not None
+        has_min_floor, has_max_floor = min_floor is not None, max_floor is not None
+        has_min_year, has_max_year = min_build_year is not None, max_build_year is not None
 
         for item in self.kb.index.get('cases', []):
             # 类型过滤
@@ -138,7 +190,10 @@ class KnowledgeBaseQuery:
                 continue
 
             # 关键词过滤
-            if keyword and keyword not in item.get('address', ''):
+            if prefix is not None:
+                if not (item.get('address') or '').startswith(prefix):
+                    continue
+            elif keyword and keyword not in item.get('address', ''):
                 continue
 
             # 区域过滤
@@ -150,31 +205,31 @@ class KnowledgeBaseQuery:
                 continue
 
             # 价格过滤
-            price = item.get('price', 0)
-            if min_price and price < min_price:
+            price = item.get('price') or 0
+            if has_min_price and price < min_price:
                 continue
-            if max_price and price > max_price:
+            if has_max_price and price > max_price:
                 continue
 
             # 面积过滤
-            area = item.get('area', 0)
-            if min_area and area < min_area:
+            area = item.get('area') or 0
+            if has_min_area and area < min_area:
                 continue
-            if max_area and area > max_area:
+            if has_max_area and area > max_area:
                 continue
 
             # 楼层过滤
-            floor = item.get('current_floor', 0)
-            if min_floor and floor < min_floor:
+            floor = item.get('current_floor') or 0
+            if has_min_floor and floor < min_floor:
                 continue
-            if max_floor and floor > max_floor:
+            if has_max_floor and floor > max_floor:
                 continue
 
             # 建成年份过滤
-            build_year = item.get('build_year', 0)
-            if min_build_year and build_year and build_year < min_build_year:
+            build_year = item.get('build_year') or 0
+            if has_min_year and build_year and build_year < min_build_year:
                 continue
-            if max_build_year and build_year and build_year > max_build_year:
+            if has_max_year and build_year and build_year > max_build_year:
                 continue
 
             # 加载完整数据
@@ -190,17 +245,18 @@ class KnowledgeBaseQuery:
     def _search_cases_db(self, **kwargs) -> List[Dict]:
         """数据库模式的案例搜索"""
         try:
-            from knowledge_base.db_connection import pg_cursor
-
             conditions = []
             params = []
 
             if kwargs.get('report_type'):
                 conditions.append("report_type = %s")
                 params.append(kwargs['report_type'])
+            prefix = None
             if kwargs.get('keyword'):
+                # 前缀匹配走 text_pattern_ops btree 索引，子串匹配走 trigram 索引
+                prefix = _keyword_prefix(kwargs['keyword'])
                 conditions.append("address LIKE %s")
-                params.append(f"%{kwargs['keyword']}%")
+                params.append(f"{prefix}%" if prefix is not None else f"%{kwargs['keyword']}%")
             if kwargs.get('district'):
                 conditions.append("district LIKE %s")
                 params.append(f"%{kwargs['district']}%")
@@ -236,24 +292,25 @@ class KnowledgeBaseQuery:
             limit = kwargs.get('limit', 50)
             params.append(limit)
 
+            sql = f"""
+                SELECT case_id, doc_id, report_type, address, district, street,
+                       area, price, usage, build_year, total_floor, current_floor,
+                       orientation, decoration, structure, case_data
+                FROM cases 
+                WHERE {where_clause}
+                ORDER BY create_time DESC
+                LIMIT %s
+            """
             with pg_cursor(commit=False) as cursor:
-                cursor.execute(f"""
-                    SELECT case_id, doc_id, report_type, address, district, street,
-                           area, price, usage, build_year, total_floor, current_floor,
-                           orientation, decoration, structure, case_data
-                    FROM cases 
-                    WHERE {where_clause}
-                    ORDER BY create_time DESC
-                    LIMIT %s
-                """, params)
-
-                results = []
-                for row in cursor.fetchall():
-                    case_data = row[15]
-                    if isinstance(case_data, str):
-                        case_data = json.loads(case_data)
+                if prefix is not None:
+                    # 前缀匹配不用预备语句：通用计划里 LIKE $1 的前缀未知，用不上 text_pattern_ops 索引
+                    cursor.execute(sql, params)
+                else:
+                    execute_prepared(cursor, _statement_name('kb_search_cases', where_clause), sql, tuple(params))
 
-                    results.append({
+                # case_data 已由驱动（orjson 类型转换器）解码为 dict
+                return [
+                    {
                         'case_id': row[0],
                         'from_doc': row[1],
                         'report_type': row[2],
@@ -269,10 +326,10 @@ class KnowledgeBaseQuery:
                         'orientation': row[12],
                         'decoration': row[13],
                         'structure': row[14],
-                        **(case_data or {}),
-                    })
-
-                return results
+                        **(row[15] or {}),
+                    }
+                    for row in cursor
+                ]
         except Exception as e:
             print(f"⚠️ 数据库搜索案例失败: {e}")
             return []
@@ -306,8 +363,6 @@ class KnowledgeBaseQuery:
     def _search_reports_db(self, keyword: str = None, report_type: str = None, limit: int = 50) -> List[Dict]:
         """数据库模式的报告搜索"""
         try:
-            from knowledge_base.db_connection import pg_cursor
-
             conditions = []
             params = []
 
@@ -322,31 +377,27 @@ class KnowledgeBaseQuery:
             params.append(limit)
 
             with pg_cursor(commit=False) as cursor:
-                cursor.execute(f"""
+                execute_prepared(cursor, _statement_name('kb_search_reports', where_clause), f"""
                     SELECT doc_id, filename, report_type, address, area, case_count, metadata
                     FROM documents 
                     WHERE {where_clause}
                     ORDER BY create_time DESC
                     LIMIT %s
-                """, params)
-
-                results = []
-                for row in cursor.fetchall():
-                    metadata = row[6]
-                    if isinstance(metadata, str):
-                        metadata = json.loads(metadata)
+                """, tuple(params))
 
-                    results.append({
+                # metadata 已由驱动（orjson 类型转换器）解码为 dict
+                return [
+                    {
                         'doc_id': row[0],
                         'source_file': row[1],
                         'report_type': row[2],
                         'address': row[3],
                         'area': row[4],
                         'case_count': row[5],
-                        **(metadata or {}),
-                    })
-
-                return results
+                        **(row[6] or {}),
+                    }
+                    for row in cursor
+                ]
         except Exception as e:
             print(f"⚠️ 数据库搜索报告失败: {e}")
             return []
@@ -382,24 +433,154 @@ class KnowledgeBaseQuery:
         Returns:
             [(案例, 相似度分数), ...]
         """
+        # 数据库模式：在 SQL 中打分，只取回前 top_k 个
+        if self._use_db:
+            return self._find_similar_cases_db(
+                address, area, price, district, usage, floor, build_year, report_type, top_k
+            )
+
         # 获取所有案例
         all_cases = self._get_all_cases(report_type)
 
-        # 计算相似度
-        scored = []
-        for item in all_cases:
-            score = self._calculate_similarity(
-                item, address, area, price, district, usage, floor, build_year
-            )
-            if score > 0:
-                # 获取完整案例数据
-                case_data = self.kb.get_case(item['case_id'])
-                if case_data:
-                    scored.append((case_data, score))
+        # 在索引行上计算相似度
+        top = None
+        if len(all_cases) >= _NUMPY_SCORE_MIN_ROWS:
+            try:
+                top = self._top_similar_numpy(all_cases, address, area, price, district, usage, floor, build_year, top_k)
+            except ImportError:
+                pass
+        if top is None:
+            scored = []
+            for item in all_cases:
+                score = self._calculate_similarity(
+                    item, address, area, price, district, usage, floor, build_year
+                )
+                if score > 0:
+                    scored.append((score, item['case_id']))
+            top = heapq.nlargest(top_k, scored, key=itemgetter(0))
+
+        # 只为前 top_k 个加载完整案例数据（一次批量读取）
+        cases = {case['case_id']: case for case in self.kb.get_cases([case_id for _, case_id in top])}
+        return [(cases[case_id], score) for score, case_id in top if case_id in cases]
+
+    def _top_similar_numpy(self, all_cases: List[Dict], address: str, area: float, price: float,
+                           district: str, usage: str, floor: int, build_year: int,
+                           top_k: int) -> List[Tuple[float, str]]:
+        """
+        用 numpy 按列计算相似度，返回前 top_k 个 (分数, case_id)
+
+        各项的计算和累加顺序与 _calculate_similarity 相同，分数逐位一致；同分时保持原顺序
+        """
+        import numpy as np
+
+        n = len(all_cases)
+        scores = np.zeros(n)
+
+        def column(name):
+            return np.fromiter((float(item.get(name) or 0) for item in all_cases), dtype=float, count=n)
 
-        # 排序返回
-        scored.sort(key=lambda x: x[1], reverse=True)
-        return scored[:top_k]
+        if district:
+            scores += np.fromiter(
+                (0.25 if item.get('district') and district in item['district'] else 0.0 for item in all_cases),
+                dtype=float, count=n)
+        if usage:
+            scores += np.fromiter(
+                (0.15 if item.get('usage') and item['usage'] == usage else 0.0 for item in all_cases),
+                dtype=float, count=n)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for value, name, weight in ((area, 'area', 0.20), (price, 'price', 0.15)):
+                if value:
+                    value = float(value)
+                    item_values = column(name)
+                    ratio = np.minimum(value, item_values) / np.maximum(value, item_values)
+                    scores += np.where((item_values > 0) & (ratio > 0.5), ratio * weight, 0.0)
+
+        for value, name, max_diff, scale in ((floor, 'current_floor', 3, 10), (build_year, 'build_year', 10, 20)):
+            if value:
+                item_values = column(name)
+                diff = np.abs(float(value) - item_values)
+                scores += np.where((item_values > 0) & (diff <= max_diff), (1 - diff / scale) * 0.10, 0.0)
+
+        if address:
+            shingles = _address_shingles(address)
+            if shingles:
+                scores += np.fromiter(
+                    (min(sum(1 for s in shingles if s in item_address) * 0.01, 0.05)
+                     if (item_address := item.get('address')) else 0.0 for item in all_cases),
+                    dtype=float, count=n)
+
+        hits = np.nonzero(scores > 0)[0]
+        order = hits[np.argsort(-scores[hits], kind='stable')][:top_k]
+        return [(float(scores[i]), all_cases[i]['case_id']) for i in order]
+
+    def _find_similar_cases_db(self, address: str, area: float, price: float,
+                               district: str, usage: str, floor: int, build_year: int,
+                               report_type: str, top_k: int) -> List[Tuple[Dict, float]]:
+        """数据库模式的相似案例查找（打分表达式与 _calculate_similarity 一致）"""
+        terms = []
+        params = []
+
+        # 1. 区域匹配（权重0.25）
+        if district:
+            terms.append("CASE WHEN strpos(district, %s) > 0 THEN 0.25 ELSE 0 END")
+            params.append(district)
+
+        # 2. 用途匹配（权重0.15）
+        if usage:
+            terms.append("CASE WHEN usage = %s THEN 0.15 ELSE 0 END")
+            params.append(usage)
+
+        # 3/4. 面积、价格相似度（权重0.20 / 0.15），比值 > 0.5 才计分
+        for value, column, weight in ((area, 'area', '0.20'), (price, 'price', '0.15')):
+            if value:
+                ratio = f"LEAST({column}, %s::float8) / GREATEST({column}, %s::float8)"
+                terms.append(f"CASE WHEN {column} > 0 AND {ratio} > 0.5 THEN {ratio} * {weight} ELSE 0 END")
+                params.extend([float(value)] * 4)
+
+        # 5/6. 楼层、建成年份相似度（权重0.10），差值在范围内才计分
+        for value, column, max_diff, scale in ((floor, 'current_floor', 3, 10), (build_year, 'build_year', 10, 20)):
+            if value:
+                diff = f"abs(%s::float8 - {column})"
+                terms.append(f"CASE WHEN {column} > 0 AND {diff} <= {max_diff} "
+                             f"THEN (1 - {diff} / {scale}) * 0.10 ELSE 0 END")
+                params.extend([float(value)] * 2)
+
+        # 7. 地址关键词匹配（权重0.05）：查询地址的二字片段在案例地址中出现的个数
+        shingles = _address_shingles(address) if address else ()
+        if shingles:
+            terms.append("LEAST((SELECT count(*) FROM unnest(%s::text[]) AS s WHERE strpos(address, s) > 0) "
+                         "* 0.01::float8, 0.05)")
+            params.append(list(shingles))
+
+        if not terms:
+            return []
+
+        where_clause = "1=1"
+        if report_type:
+            where_clause = "report_type = %s"
+            params.append(report_type)
+        params.append(top_k)
+
+        try:
+            with pg_cursor(commit=False) as cursor:
+                cursor.execute(f"""
+                    SELECT case_id, score FROM (
+                        SELECT case_id, create_time, ({' + '.join(f'({t})::float8' for t in terms)}) AS score
+                        FROM cases
+                        WHERE {where_clause}
+                    ) scored
+                    WHERE score > 0
+                    ORDER BY score DESC, create_time DESC
+                    LIMIT %s
+                """, params)
+                top = cursor.fetchall()
+        except Exception as e:
+            print(f"⚠️ 数据库查找相似案例失败: {e}")
+            return []
+
+        cases = {case['case_id']: case for case in self.kb.get_cases([case_id for case_id, _ in top])}
+        return [(cases[case_id], score) for case_id, score in top if case_id in cases]
 
     def _calculate_similarity(self, item: Dict, address: str, area: float,
                               price: float, district: str, usage: str,
@@ -455,8 +636,8 @@ class KnowledgeBaseQuery:
         if address:
             item_address = item.get('address', '')
             if item_address:
-                # 简单关键词匹配
-                matches = sum(1 for c in address if c in item_address and len(c) > 1)
+                # 查询地址的二字片段在案例地址中出现的个数
+                matches = sum(1 for s in _address_shingles(address) if s in item_address)
                 if matches > 0:
                     score += min(matches * 0.01, 0.05)
 
@@ -466,8 +647,45 @@ class KnowledgeBaseQuery:
     # 统计分析（为生成提供参考数据）
     # ========================================================================
 
+    def _get_range_db(self, column: str, report_type: str = None) -> Dict:
+        """数据库模式的范围统计：一次聚合查询，只取回统计值（分位数取法与文件模式一致）"""
+        empty = {'min': 0, 'max': 0, 'avg': 0, 'std': 0, 'count': 0, 'q1': 0, 'q3': 0}
+        where_clause = f"{column} > 0"
+        params = []
+        if report_type:
+            where_clause += " AND report_type = %s"
+            params.append(report_type)
+
+        try:
+            with pg_cursor(commit=False) as cursor:
+                cursor.execute(f"""
+                    SELECT min(v), max(v), avg(v), stddev_pop(v), count(*),
+                           (array_agg(v ORDER BY v))[count(*)::int / 4 + 1],
+                           (array_agg(v ORDER BY v))[(3 * count(*)::int) / 4 + 1]
+                    FROM (SELECT {column} AS v FROM cases WHERE {where_clause}) t
+                """, params)
+                row = cursor.fetchone()
+        except Exception as e:
+            print(f"⚠️ 数据库统计 {column} 失败: {e}")
+            return empty
+
+        if not row or not row[4]:
+            return empty
+        return {
+            'min': row[0],
+            'max': row[1],
+            'avg': row[2],
+            'std': row[3],
+            'count': row[4],
+            'q1': row[5],
+            'q3': row[6],
+        }
+
     def get_price_range(self, report_type: str = None) -> Dict:
         """获取价格范围统计"""
+        if self._use_db:
+            return self._get_range_db('price', report_type)
+
         cases = self._get_all_cases(report_type)
 
         prices = []
@@ -505,6 +723,9 @@ class KnowledgeBaseQuery:
 
     def get_area_range(self, report_type: str = None) -> Dict:
         """获取面积范围统计"""
+        if self._use_db:
+            return self._get_range_db('area', report_type)
+
         cases = self._get_all_cases(report_type)
 
         areas = []
@@ -540,8 +761,48 @@ class KnowledgeBaseQuery:
             'q3': q3,
         }
 
+    def _get_correction_stats_db(self, report_type: str = None) -> Dict:
+        """数据库模式的修正系数统计：在 case_data 上一次聚合出全部五项"""
+        # 字段可能是 {'value': x} 或直接是数值，只统计数值且 > 0 的
+        values = []
+        aggregates = []
+        for key, field in _CORRECTION_FIELDS:
+            val = f"COALESCE(case_data->'{field}'->'value', case_data->'{field}')"
+            values.append(f"CASE WHEN jsonb_typeof({val}) = 'number' THEN ({val} #>> '{{}}')::float8 END AS c_{key}")
+            aggregates.extend(
+                f"{agg}(c_{key}) FILTER (WHERE c_{key} > 0)"
+                for agg in ('min', 'max', 'avg', 'stddev_pop', 'count')
+            )
+
+        where_clause = "1=1"
+        params = []
+        if report_type:
+            where_clause = "report_type = %s"
+            params.append(report_type)
+
+        result = {key: {'min': 0, 'max': 0, 'avg': 0, 'std': 0, 'count': 0} for key, _ in _CORRECTION_FIELDS}
+        try:
+            with pg_cursor(commit=False) as cursor:
+                cursor.execute(f"""
+                    SELECT {', '.join(aggregates)}
+                    FROM (SELECT {', '.join(values)} FROM cases WHERE {where_clause}) t
+                """, params)
+                row = cursor.fetchone()
+        except Exception as e:
+            print(f"⚠️ 数据库统计修正系数失败: {e}")
+            return result
+
+        for i, (key, _) in enumerate(_CORRECTION_FIELDS):
+            min_val, max_val, avg, std, count = row[i * 5:i * 5 + 5]
+            if count:
+                result[key] = {'min': min_val, 'max': max_val, 'avg': avg, 'std': std, 'count': count}
+        return result
+
     def get_correction_stats(self, report_type: str = None) -> Dict:
         """获取修正系数统计"""
+        if self._use_db:
+            return self._get_correction_stats_db(report_type)
+
         cases = self._get_all_cases(report_type)
 
         stats = {
@@ -557,13 +818,7 @@ class KnowledgeBaseQuery:
             if not case_data:
                 continue
 
-            for key, field in [
-                ('transaction', 'transaction_correction'),
-                ('market', 'market_correction'),
-                ('location', 'location_correction'),
-                ('physical', 'physical_correction'),
-                ('rights', 'rights_correction'),
-            ]:
+            for key, field in _CORRECTION_FIELDS:
                 if field in case_data:
                     val = case_data[field]
                     if isinstance(val, dict):
@@ -596,13 +851,15 @@ class KnowledgeBaseQuery:
     # 向量检索（如果启用）
     # ========================================================================
 
-    def vector_search(self, query_text: str, top_k: int = 10) -> List[Tuple[Dict, float]]:
+    def vector_search(self, query_text: str, top_k: int = 10,
+                      filter_ids: List[str] = None) -> List[Tuple[Dict, float]]:
         """
         向量相似搜索
 
         Args:
             query_text: 查询文本
             top_k: 返回数量
+            filter_ids: 限定在这些案例ID中搜索（可选）
 
         Returns:
             [(案例, 相似度), ...]
@@ -611,20 +868,45 @@ class KnowledgeBaseQuery:
             return []
 
         try:
-            results = self.kb.vector_store.search(query_text, top_k)
-
-            # 加载完整案例数据
-            enriched = []
-            for case_id, score in results:
-                case_data = self.kb.get_case(case_id)
-                if case_data:
-                    enriched.append((case_data, score))
+            results = self.kb.vector_store.search(query_text, top_k, filter_ids=filter_ids)
 
-            return enriched
+            # 加载完整案例数据（一次批量读取）
+            cases = {case['case_id']: case for case in self.kb.get_cases([case_id for case_id, _ in results])}
+            return [(cases[case_id], score) for case_id, score in results if case_id in cases]
         except Exception as e:
             print(f"⚠️ 向量检索失败: {e}")
             return []
 
+    def _filter_case_ids(self, district: str = None, usage: str = None,
+                         report_type: str = None) -> List[str]:
+        """按区域/用途/类型过滤，返回符合条件的案例ID（用于限定向量检索范围）"""
+        if self._use_db:
+            conditions = []
+            params = []
+            if report_type:
+                conditions.append("report_type = %s")
+                params.append(report_type)
+            if district:
+                conditions.append("district LIKE %s")
+                params.append(f"%{district}%")
+            if usage:
+                conditions.append("usage = %s")
+                params.append(usage)
+
+            try:
+                with pg_cursor(commit=False) as cursor:
+                    cursor.execute(f"SELECT case_id FROM cases WHERE {' AND '.join(conditions) or '1=1'}", params)
+                    return [row[0] for row in cursor]
+            except Exception as e:
+                print(f"⚠️ 数据库过滤案例失败: {e}")
+                return []
+
+        return [
+            item['case_id'] for item in self._get_all_cases(report_type)
+            if (not district or district in (item.get('district') or ''))
+            and (not usage or item.get('usage') == usage)
+        ]
+
     def hybrid_search(self,
                       query_text: str = None,
                       district: str = None,
@@ -644,23 +926,14 @@ class KnowledgeBaseQuery:
         Returns:
             案例列表
         """
-        # 先用向量检索
+        # 先按条件过滤出候选ID，再只在这些ID中做向量检索
         if query_text and hasattr(self.kb, 'vector_store') and self.kb.vector_store:
-            vector_results = self.vector_search(query_text, top_k * 2)
-            candidates = [case for case, _ in vector_results]
-        else:
-            # 没有向量检索，用普通搜索
-            candidates = self._get_all_cases(report_type)[:top_k * 2]
-
-        # 再用条件过滤
-        filtered = []
-        for case in candidates:
-            if district and district not in case.get('district', ''):
-                continue
-            if usage and case.get('usage') != usage:
-                continue
-            if report_type and case.get('report_type') != report_type:
-                continue
-            filtered.append(case)
-
-        return filtered[:top_k]
\ No newline at end of file
+            filter_ids = None
+            if district or usage or report_type:
+                filter_ids = self._filter_case_ids(district, usage, report_type)
+                if not filter_ids:
+                    return []
+            return [case for case, _ in self.vector_search(query_text, top_k, filter_ids=filter_ids)]
+
+        # 没有向量检索，用条件搜索
+        return self.search_cases(report_type=report_type, district=district, usage=usage, limit=top_k)
@@ -0,0 +1,166 @@
+"""
+SQLite 索引
+===========
+文件版知识库的可选索引后端：报告/案例索引行存入 index.db，
+按 doc_id / from_doc / report_type 建索引，过滤和删除不再扫描全部行
+"""
+
+import json
+import sqlite3
+import threading
+from typing import List, Dict, Optional, Iterable
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _dumps(row: Dict) -> str:
+    if HAS_ORJSON:
+        return orjson.dumps(row, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(row, ensure_ascii=False)
+
+
+def _loads(data: str) -> Dict:
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    doc_id      TEXT PRIMARY KEY,
+    report_type TEXT,
+    data        TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cases (
+    case_id     TEXT PRIMARY KEY,
+    from_doc    TEXT,
+    report_type TEXT,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reports_type ON reports(report_type);
+CREATE INDEX IF NOT EXISTS idx_cases_doc ON cases(from_doc);
+CREATE INDEX IF NOT EXISTS idx_cases_type ON cases(report_type);
+"""
+
+
+class SqliteIndex:
+    """
+    SQLite 索引存储
+
+    索引行整行以 JSON 存在 data 列（与 JSON 索引的行结构一致），
+    只把用于过滤的字段单独建列；行顺序按插入顺序（rowid）
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def is_empty(self) -> bool:
+        """是否还没有任何报告"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM reports LIMIT 1").fetchone() is None
+
+    def add(self, reports: Iterable[Dict], cases: Iterable[Dict]):
+        """批量写入报告和案例索引行（一个事务）"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO reports (doc_id, report_type, data) VALUES (?, ?, ?)",
+                [(r['doc_id'], r.get('report_type'), _dumps(r)) for r in reports],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cases (case_id, from_doc, report_type, data) VALUES (?, ?, ?, ?)",
+                [(c['case_id'], c.get('from_doc'), c.get('report_type'), _dumps(c)) for c in cases],
+            )
+
+    def delete_report(self, doc_id: str) -> List[Dict]:
+        """删除报告及其案例索引行，返回被删除的案例行"""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT data FROM cases WHERE from_doc = ? ORDER BY rowid", (doc_id,)
+            ).fetchall()
+            self._conn.execute("DELETE FROM cases WHERE from_doc = ?", (doc_id,))
+            self._conn.execute("DELETE FROM reports WHERE doc_id = ?", (doc_id,))
+        return [_loads(data) for (data,) in rows]
+
+    def get_report(self, doc_id: str) -> Optional[Dict]:
+        """按 doc_id 取报告索引行"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM reports WHERE doc_id = ?", (doc_id,)).fetchone()
+        return _loads(row[0]) if row else None
+
+    def get_case(self, case_id: str) -> Optional[Dict]:
+        """按 case_id 取案例索引行"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM cases WHERE case_id = ?", (case_id,)).fetchone()
+        return _loads(row[0]) if row else None
+
+    def list_reports(self, report_type: str = None) -> List[Dict]:
+        """列出报告索引行"""
+        return self._select('reports', report_type)
+
+    def list_cases(self, report_type: str = None) -> List[Dict]:
+        """列出案例索引行"""
+        return self._select('cases', report_type)
+
+    def _select(self, table: str, report_type: str = None) -> List[Dict]:
+        sql = f"SELECT data FROM {table}"
+        params = ()
+        if report_type:
+            sql += " WHERE report_type = ?"
+            params = (report_type,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY rowid", params).fetchall()
+        return [_loads(data) for (data,) in rows]
+
+    def iter_cases(self) -> Iterable[Dict]:
+        """按插入顺序逐行迭代案例索引行（不一次性载入全部行）"""
+        with self._lock:
+            cursor = self._conn.execute("SELECT data FROM cases ORDER BY rowid")
+            for (data,) in cursor:
+                yield _loads(data)
+
+    def case_bytes(self) -> int:
+        """全部案例在 cases.jsonl 中占用的字节数"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(json_extract(data, '$._length')), 0) FROM cases"
+            ).fetchone()[0]
+
+    def update_offsets(self, offsets: Dict[str, int]):
+        """cases.jsonl 重写后更新案例行的 _offset"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE cases SET data = json_set(data, '$._offset', ?) WHERE case_id = ?",
+                [(offset, case_id) for case_id, offset in offsets.items()],
+            )
+
+    def counts(self) -> Dict:
+        """报告数 / 案例数 / 按类型的报告数"""
+        with self._lock:
+            total_cases = self._conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+            by_type = dict(self._conn.execute(
+                "SELECT COALESCE(report_type, 'unknown'), COUNT(*) FROM reports GROUP BY 1"
+            ).fetchall())
+        return {
+            'total_reports': sum(by_type.values()),
+            'total_cases': total_cases,
+            'by_type': by_type,
+        }
+
+    def clear(self):
+        """清空全部索引行"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cases")
+            self._conn.execute("DELETE FROM reports")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -15,7 +15,7 @@ from dataclasses import dataclass
 class VectorStoreConfig:
     """向量存储配置"""
     model_path: str = "/opt/models/bge-large-zh-v1.5"
-    index_type: str = "FlatIP"  # 内积，配合归一化等价于余弦相似度
+    index_type: str = os.getenv("VECTOR_INDEX_TYPE", "FlatIP")  # 内积，配合归一化等价于余弦相似度；SQ8 为 int8 标量量化
     dimension: int = 1024       # BGE-large维度
     batch_size: int = 32        # 编码批次大小
 
@@ -278,8 +278,16 @@ class VectorStore:
         # 创建索引
         print(f"   构建FAISS索引...")
         dimension = vectors.shape[1]
-        self._index = faiss.IndexFlatIP(dimension)  # 内积索引
-        self._index.add(vectors.astype(np.float32))
+        vectors = vectors.astype(np.float32)
+        if self.config.index_type == "SQ8":
+            # int8 标量量化：每维 1 字节，检索时读取的数据约为 FlatIP 的 1/4
+            self._index = faiss.IndexScalarQuantizer(
+                dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+            self._index.train(vectors)
+        else:
+            self._index = faiss.IndexFlatIP(dimension)  # 内积索引
+        self._index.add(vectors)
         
         self._case_ids = case_ids
         self._dirty = False
@@ -306,17 +314,28 @@ class VectorStore:
         if self._index is None or self._index.ntotal == 0:
             return []
         
+        # 如果有filter_ids，只在对应的向量位置中搜索，保证返回满 top_k 个
+        search_params = None
+        search_k = min(top_k, self._index.ntotal)
+        if filter_ids:
+            import faiss
+            wanted = set(filter_ids)
+            positions = np.fromiter(
+                (i for i, case_id in enumerate(self._case_ids) if case_id in wanted), dtype=np.int64
+            )
+            if len(positions) == 0:
+                return []
+            search_params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(positions))
+            search_k = min(top_k, len(positions))
+        
         # 编码查询
         query_vector = self.encode_query(query)
         
         # 搜索
-        # 如果有filter_ids，搜更多然后过滤
-        search_k = top_k * 3 if filter_ids else top_k
-        search_k = min(search_k, self._index.ntotal)
-        
         scores, indices = self._index.search(
             query_vector.astype(np.float32), 
-            search_k
+            search_k,
+            params=search_params
         )
         
         # 组装结果
@@ -328,10 +347,6 @@ class VectorStore:
             case_id = self._case_ids[idx]
             score = float(scores[0][i])
             
-            # 过滤
-            if filter_ids and case_id not in filter_ids:
-                continue
-            
             results.append((case_id, score))
             
             if len(results) >= top_k:
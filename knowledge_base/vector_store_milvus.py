@@ -5,12 +5,23 @@ Milvus 向量存储
 """
 
 import os
+import json
 import numpy as np
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass
 
 from .db_connection import connect_milvus, get_milvus_collection, MILVUS_CONFIG
 
+# filter_ids 不超过该数量时写进过滤表达式；超过时多取候选再在本地过滤（表达式长度有界）
+_FILTER_IDS_EXPR_MAX = 1000
+# Milvus 单次检索的 limit 上限
+_SEARCH_LIMIT_MAX = 16384
+
+
+def _quote(value: str) -> str:
+    """转成过滤表达式里的字符串字面量（双引号，转义引号和反斜杠）"""
+    return json.dumps(str(value), ensure_ascii=False)
+
 
 @dataclass
 class MilvusVectorStoreConfig:
@@ -177,7 +188,13 @@ class MilvusVectorStore:
         # 清空现有数据
         self.clear()
 
-        # 构建数据
+        count = self.add_batch(cases)
+
+        self._dirty = False
+        print(f"   ✓ 向量索引构建完成: {count}条向量")
+
+    def add_batch(self, cases: List[Dict]) -> int:
+        """批量编码并插入案例向量，返回插入条数"""
         case_ids = []
         doc_ids = []
         report_types = []
@@ -196,9 +213,8 @@ class MilvusVectorStore:
                 texts.append(text)
 
         if not texts:
-            print("⚠️ 没有有效文本，跳过向量索引构建")
-            self._dirty = False
-            return
+            print("⚠️ 没有有效文本，跳过向量插入")
+            return 0
 
         # 编码
         print(f"   编码 {len(texts)} 条文本...")
@@ -221,9 +237,7 @@ class MilvusVectorStore:
 
         # 刷新
         collection.flush()
-
-        self._dirty = False
-        print(f"   ✓ 向量索引构建完成: {len(case_ids)}条向量")
+        return len(case_ids)
 
     def add(self, case_data: Dict):
         """添加单个案例到向量索引"""
@@ -252,15 +266,18 @@ class MilvusVectorStore:
             return
 
         collection = self.collection
-        expr = f"case_id in {case_ids}"
-        collection.delete(expr)
+        case_ids = list(case_ids)
+        for start in range(0, len(case_ids), _FILTER_IDS_EXPR_MAX):
+            chunk = case_ids[start:start + _FILTER_IDS_EXPR_MAX]
+            collection.delete(f"case_id in [{', '.join(map(_quote, chunk))}]")
         collection.flush()
 
     def search(self,
                query: str,
                top_k: int = 20,
-               report_type: str = None) -> List[Tuple[str, float]]:
-        """向量检索"""
+               report_type: str = None,
+               filter_ids: List[str] = None) -> List[Tuple[str, float]]:
+        """向量检索（filter_ids: 限定在这些ID中搜索，可选）"""
         collection = self.collection
 
         # 确保 collection 已加载
@@ -276,16 +293,25 @@ class MilvusVectorStore:
         }
 
         # 过滤条件
-        expr = None
+        conditions = []
         if report_type:
-            expr = f'report_type == "{report_type}"'
+            conditions.append(f'report_type == {_quote(report_type)}')
+        wanted = None
+        limit = top_k
+        if filter_ids:
+            if len(filter_ids) <= _FILTER_IDS_EXPR_MAX:
+                conditions.append(f"case_id in [{', '.join(map(_quote, filter_ids))}]")
+            else:
+                wanted = set(filter_ids)
+                limit = _SEARCH_LIMIT_MAX
+        expr = ' and '.join(conditions) or None
 
         # 搜索
         results = collection.search(
             data=query_vector.tolist(),
             anns_field="embedding",
             param=search_params,
-            limit=top_k,
+            limit=limit,
             expr=expr,
             output_fields=["case_id"],
         )
@@ -294,7 +320,12 @@ class MilvusVectorStore:
         output = []
         for hits in results:
             for hit in hits:
-                output.append((hit.entity.get('case_id'), hit.score))
+                case_id = hit.entity.get('case_id')
+                if wanted is not None and case_id not in wanted:
+                    continue
+                output.append((case_id, hit.score))
+                if len(output) >= top_k:
+                    return output
 
         return output
 
@@ -346,7 +377,7 @@ class MilvusVectorStore:
 
         # 创建索引
         index_params = {
-            "index_type": "IVF_FLAT",
+            "index_type": MILVUS_CONFIG['index_type'],
             "metric_type": "IP",
             "params": {"nlist": 1024}
         }
@@ -117,7 +117,7 @@ class RealEstateKBSystem:
         if self.kb.enable_vector and success:
             print(f"\n📐 重建向量索引...")
             try:
-                self.kb.rebuild_vector_index()
+                self.kb.rebuild_vector_index(force=True)
             except Exception as e:
                 print(f"   ⚠️ 向量索引构建失败: {e}")
 
@@ -237,7 +237,7 @@ class RealEstateKBSystem:
 
     def rebuild_vector_index(self):
         """重建向量索引"""
-        self.kb.rebuild_vector_index()
+        self.kb.rebuild_vector_index(force=True)
 
     def stats(self):
         """
@@ -13,7 +13,7 @@ load_dotenv()
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from knowledge_base.db_connection import get_pg_connection, get_milvus_collection, connect_milvus
+from knowledge_base.db_connection import get_pg_connection, get_milvus_collection, connect_milvus, MILVUS_CONFIG
 
 
 def init_postgresql():
@@ -163,6 +163,9 @@ def init_postgresql():
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_report_type ON documents(report_type)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_org_id ON documents(org_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_metadata ON documents USING GIN(metadata)")
+        # 地址 '%xx%' 模糊搜索用 trigram 索引
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_address_trgm ON documents USING GIN(address gin_trgm_ops)")
         print("  ✓ documents 表")
 
         # ========== 6. cases 表 ==========
@@ -199,6 +202,17 @@ def init_postgresql():
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_price ON cases(price)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_org_id ON cases(org_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_case_data ON cases USING GIN(case_data)")
+        # search_cases: district / address 模糊匹配用 trigram 索引，等值 + 范围过滤用组合索引
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_district_trgm ON cases USING GIN(district gin_trgm_ops)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_address_trgm ON cases USING GIN(address gin_trgm_ops)")
+        # 关键词以 * 结尾时按前缀匹配（'xx%'），非 C 排序规则下需要 text_pattern_ops 才能走 btree
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_address_tpo ON cases(address text_pattern_ops)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_type_area ON cases(report_type, area)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_type_price ON cases(report_type, price)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_usage_area ON cases(usage, area)")
+        # 按 create_time DESC 排序取前 N 条时直接走索引
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_create_time ON cases(create_time DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cases_type_time ON cases(report_type, create_time DESC)")
         print("  ✓ cases 表")
 
         # ========== 7. review_tasks 表 ==========
@@ -388,7 +402,7 @@ def init_milvus():
         # 创建索引
         index_params = {
             "metric_type": "IP",
-            "index_type": "IVF_FLAT",
+            "index_type": MILVUS_CONFIG['index_type'],
             "params": {"nlist": 128}
         }
         collection.create_index(field_name="embedding", index_params=index_params)
@@ -144,6 +144,9 @@ CREATE TABLE IF NOT EXISTS documents (
 CREATE INDEX IF NOT EXISTS idx_documents_report_type ON documents(report_type);
 CREATE INDEX IF NOT EXISTS idx_documents_org_id ON documents(org_id);
 CREATE INDEX IF NOT EXISTS idx_documents_metadata ON documents USING GIN(metadata);
+-- 地址 '%xx%' 模糊搜索用 trigram GIN 索引（btree 用不上前导 %）
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_documents_address_trgm ON documents USING GIN(address gin_trgm_ops);
 
 
 -- ============================================================================
@@ -181,6 +184,19 @@ CREATE INDEX IF NOT EXISTS idx_cases_price ON cases(price);
 CREATE INDEX IF NOT EXISTS idx_cases_org_id ON cases(org_id);
 CREATE INDEX IF NOT EXISTS idx_cases_case_data ON cases USING GIN(case_data);
 
+-- search_cases: district / address 为 '%xx%' 模糊匹配，btree 用不上，用 trigram GIN 索引
+CREATE INDEX IF NOT EXISTS idx_cases_district_trgm ON cases USING GIN(district gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_cases_address_trgm ON cases USING GIN(address gin_trgm_ops);
+-- search_cases: 关键词以 * 结尾时按前缀匹配（'xx%'），非 C 排序规则下需要 text_pattern_ops 才能走 btree
+CREATE INDEX IF NOT EXISTS idx_cases_address_tpo ON cases(address text_pattern_ops);
+-- search_cases: 类型/用途等值 + 面积/价格范围的组合过滤
+CREATE INDEX IF NOT EXISTS idx_cases_type_area ON cases(report_type, area);
+CREATE INDEX IF NOT EXISTS idx_cases_type_price ON cases(report_type, price);
+CREATE INDEX IF NOT EXISTS idx_cases_usage_area ON cases(usage, area);
+-- search_cases / 案例列表按 create_time DESC 排序取前 N 条，可直接走索引，不用排序
+CREATE INDEX IF NOT EXISTS idx_cases_create_time ON cases(create_time DESC);
+CREATE INDEX IF NOT EXISTS idx_cases_type_time ON cases(report_type, create_time DESC);
+
 
 -- ============================================================================
 -- 7. 业务表 - review_tasks
@@ -14,12 +14,12 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 def load_json_index(base_path: str) -> Dict:
-    """加载现有的JSON索引"""
-    index_file = os.path.join(base_path, "index", "main_index.json")
-    if os.path.exists(index_file):
-        with open(index_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {'reports': [], 'cases': []}
+    """加载现有的JSON索引（main_index.json 快照 + index.log 增量）"""
+    from knowledge_base.kb_manager import KnowledgeBaseManager as JsonKnowledgeBaseManager
+
+    if not os.path.exists(os.path.join(base_path, "index")):
+        return {'reports': [], 'cases': []}
+    return JsonKnowledgeBaseManager(base_path, enable_vector=False).index
 
 
 def load_json_report(base_path: str, doc_id: str) -> Dict:
@@ -31,9 +31,18 @@ def load_json_report(base_path: str, doc_id: str) -> Dict:
     return None
 
 
-def load_json_case(base_path: str, case_id: str) -> Dict:
-    """加载案例JSON文件"""
-    case_file = os.path.join(base_path, "cases", f"{case_id}.json")
+def load_json_case(base_path: str, case_info: Dict) -> Dict:
+    """加载案例数据（cases.jsonl 按偏移读取，旧数据读 {case_id}.json）"""
+    offset = case_info.get('_offset')
+    if offset is not None:
+        cases_log = os.path.join(base_path, "cases", "cases.jsonl")
+        if not os.path.exists(cases_log):
+            return None
+        with open(cases_log, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(case_info['_length']))
+
+    case_file = os.path.join(base_path, "cases", f"{case_info.get('case_id')}.json")
     if os.path.exists(case_file):
         with open(case_file, "r", encoding="utf-8") as f:
             return json.load(f)
@@ -95,7 +104,7 @@ def migrate_to_postgres(base_path: str):
     migrated_cases = 0
     for case_info in cases:
         case_id = case_info.get('case_id')
-        case_data = load_json_case(base_path, case_id)
+        case_data = load_json_case(base_path, case_info)
 
         if not case_data:
             print(f"  ⚠️ 案例文件不存在: {case_id}")
@@ -147,7 +156,7 @@ def rebuild_vector_index():
     from knowledge_base.kb_manager_db import KnowledgeBaseManager
 
     manager = KnowledgeBaseManager(enable_vector=True)
-    manager.rebuild_vector_index()
+    manager.rebuild_vector_index(force=True)
 
     print("  ✓ 重建完成")
 
@@ -5,6 +5,7 @@
 import os
 import subprocess
 import hashlib
+import functools
 from datetime import datetime
 from typing import Optional, Dict
 
@@ -148,7 +149,12 @@ def parse_ratio_to_float(val, *, precision=6) -> Optional[float]:
     if isinstance(val, (int, float)):
         return float(val)
 
-    s = str(val).strip()
+    return _parse_ratio_str(str(val).strip(), precision)
+
+
+@functools.lru_cache(maxsize=8192)
+def _parse_ratio_str(s: str, precision: int) -> Optional[float]:
+    """parse_ratio_to_float 的字符串解析部分（输入高度重复，按字符串缓存）"""
     if not s:
         return None
 
@@ -187,7 +193,15 @@ def parse_floor_string(floor_str: str) -> Dict:
         - '5/18' -> current: 5, total: 18
         - '1-2/2' -> current: '1-2', total: 2, is_duplex: True
         - '-1' -> current: -1 (地下室)
+
+        解析结果按输入缓存，返回副本，调用方可以修改
         """
+        return dict(_parse_floor_cached(floor_str))
+
+
+@functools.lru_cache(maxsize=8192, typed=True)
+def _parse_floor_cached(floor_str) -> Dict:
+        """parse_floor_string 的实际解析（结果被缓存共享，不要修改）"""
         result = {
             'raw': floor_str,
             'current': None,